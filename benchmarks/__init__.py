@@ -0,0 +1,3 @@
+"""
+Benchmarks for the conversion hot paths. Run ``python -m benchmarks --help``.
+"""
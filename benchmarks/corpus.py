@@ -0,0 +1,118 @@
+"""
+Synthetic documents that stress one conversion path each, plus two realistic pages.
+Everything is generated from a fixed seed, so a given scale always gives the same bytes.
+"""
+import random
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore "
+         "et dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris nisi").split()
+
+
+def sentence(rng, n=12):
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def inline_paragraph(rng):
+    parts = []
+    for _ in range(rng.randint(3, 8)):
+        kind = rng.random()
+        if kind < 0.15:
+            parts.append('<a href="https://example.com/%s">%s</a>' % (rng.choice(WORDS), sentence(rng, 2)))
+        elif kind < 0.25:
+            parts.append("<strong>%s</strong>" % sentence(rng, 2))
+        elif kind < 0.35:
+            parts.append("<em>%s</em>" % sentence(rng, 2))
+        elif kind < 0.42:
+            parts.append("<code>%s_%s()</code>" % (rng.choice(WORDS), rng.choice(WORDS)))
+        else:
+            parts.append(sentence(rng, rng.randint(4, 14)))
+    return "<p>%s.</p>\n" % " ".join(parts)
+
+
+def code_block(rng, copy_button=True):
+    lines = "\n".join('<span class="hljs-keyword">def</span> %s_%d(x):\n    <span class="hljs-keyword">return</span> x * %d'
+                      % (rng.choice(WORDS), i, i) for i in range(rng.randint(2, 6)))
+    if not copy_button:
+        return '<pre class="python"><code>%s</code></pre>\n' % lines
+    return ('<pre><div class="bg-black"><div class="flex"><span>python</span><button class="flex">'
+            '<svg stroke="currentColor"><path d="M16 4h2"></path></svg>Copy code</button></div>'
+            '<div class="p-4"><code class="hljs language-python">%s\n</code></div></div></pre>\n' % lines)
+
+
+def deep_nesting(scale):
+    depth = max(10, int(1500 * min(scale, 1)))  # libxml2 stops nesting at 2048 levels
+    return "<div>" * depth + "<p>deep <b>text</b></p>" + "</div>" * depth
+
+
+def large_table(scale):
+    rows = max(10, int(10000 * scale))
+    body = "".join("<tr><td>%d</td><td>name_%d</td><td><b>%d</b></td><td>%s</td></tr>\n" % (i, i, i * 7, "x" * (i % 13))
+                   for i in range(rows))
+    return "<table>\n<thead><tr><th>id</th><th>name</th><th>value</th><th>pad</th></tr></thead>\n<tbody>\n%s</tbody>\n</table>" % body
+
+
+def long_ordered_list(scale):
+    items = max(10, int(10000 * scale))
+    return '<ol start="3">\n%s</ol>' % "".join("<li>item %d with <i>detail</i></li>\n" % i for i in range(items))
+
+
+def many_code_blocks(scale):
+    rng = random.Random(4)
+    return "".join(inline_paragraph(rng) + code_block(rng, copy_button=i % 2 == 0) for i in range(max(4, int(500 * scale))))
+
+
+def escape_heavy(scale):
+    rng = random.Random(5)
+    return "".join("<p>%s</p>\n" % " ".join("%s_%s*%s" % (rng.choice(WORDS), rng.choice(WORDS), rng.choice(WORDS))
+                                            for _ in range(20)) for _ in range(max(4, int(2000 * scale))))
+
+
+def blog_page(scale):
+    rng = random.Random(6)
+    out = ['<html><head><title>A blog post</title></head><body><header><nav><ul>%s</ul></nav></header><article>'
+           % "".join('<li><a href="/%s">%s</a></li>' % (w, w) for w in WORDS[:8])]
+    for section in range(max(2, int(60 * scale))):
+        out.append("<h2>%s</h2>\n" % sentence(rng, 4))
+        for _ in range(rng.randint(2, 5)):
+            out.append(inline_paragraph(rng))
+        if section % 3 == 0:
+            out.append('<img src="/img/%d.png" alt="%s" title="figure %d">\n' % (section, sentence(rng, 3), section))
+        if section % 4 == 1:
+            out.append("<blockquote><p>%s</p></blockquote>\n" % sentence(rng, 20))
+        if section % 5 == 2:
+            out.append("<ul>%s</ul>\n" % "".join("<li>%s</li>" % sentence(rng, 6) for _ in range(5)))
+    out.append("</article><footer><p>&copy; 2024 %s</p></footer></body></html>" % sentence(rng, 3))
+    return "".join(out)
+
+
+def docs_page(scale):
+    rng = random.Random(7)
+    out = ["<html><body><main>"]
+    for section in range(max(2, int(40 * scale))):
+        out.append("<h3>%s</h3>\n" % sentence(rng, 3))
+        out.append(inline_paragraph(rng))
+        out.append(code_block(rng, copy_button=section % 2 == 0))
+        if section % 3 == 0:
+            out.append("<table><tr><th>option</th><th>default</th></tr>%s</table>\n"
+                       % "".join("<tr><td><code>%s</code></td><td>%d</td></tr>" % (rng.choice(WORDS), i) for i in range(6)))
+        if section % 4 == 0:
+            out.append("<ol>%s</ol>\n" % "".join("<li>%s<ul><li>%s</li></ul></li>" % (sentence(rng, 5), sentence(rng, 3))
+                                                 for _ in range(3)))
+    out.append("</main></body></html>")
+    return "".join(out)
+
+
+CORPUS = {
+    "deep_nesting": deep_nesting,
+    "large_table": large_table,
+    "long_ordered_list": long_ordered_list,
+    "many_code_blocks": many_code_blocks,
+    "escape_heavy": escape_heavy,
+    "blog_page": blog_page,
+    "docs_page": docs_page,
+}
+
+
+def generate(scale=1.0, names=None):
+    """Return {name: html} for the named documents (all by default) at the given scale."""
+    return {name: CORPUS[name](scale) for name in (names or CORPUS)}
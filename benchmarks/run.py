@@ -0,0 +1,132 @@
+"""
+Time each engine phase by phase (cleanup_code, parse, process_tag) over the synthetic corpus, report
+throughput and peak Python memory, and optionally write the results as JSON for comparing runs.
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import markdownify
+from markdownify import cleanup_code, parse_fast, parse_html, parse_lxml, process_tag
+
+from .corpus import CORPUS, generate
+
+# The same steps as the engine functions themselves, split so each can be timed on its own
+ENGINES = {
+    'markdownify': (markdownify.markdownify, parse_html),
+    'markdownify_fast': (markdownify.markdownify_fast, parse_fast),
+    'markdownify_lxml': (markdownify.markdownify_lxml, parse_lxml),
+}
+PHASES = ('cleanup_code', 'parse', 'process_tag')
+
+
+def run_phases(parse, html):
+    """Convert html once, returning (markdown, {phase: seconds})."""
+    timer = time.perf_counter
+    t0 = timer()
+    text = cleanup_code(html)
+    t1 = timer()
+    tree = parse(text)
+    t2 = timer()
+    markdown = '' if tree is None else process_tag(tree, as_inline=False, children_only=True)
+    t3 = timer()
+    return markdown, {'cleanup_code': t1 - t0, 'parse': t2 - t1, 'process_tag': t3 - t2}
+
+
+def peak_memory(convert, html):
+    """Peak bytes allocated by Python code while converting html. Memory libxml2 allocates itself is not seen."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        convert(html)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench(name, html, engine, repeat):
+    convert, parse = ENGINES[engine]
+    markdown, best = run_phases(parse, html)
+    if markdown != convert(html):
+        raise AssertionError('%s: phased %s output differs from the engine function' % (name, engine))
+    for _ in range(repeat - 1):
+        _, times = run_phases(parse, html)
+        best = {phase: min(best[phase], times[phase]) for phase in PHASES}
+    size = len(html.encode('utf-8'))
+    total = sum(best.values())
+    return {
+        'document': name,
+        'engine': engine,
+        'bytes': size,
+        'seconds': best,
+        'total': total,
+        'mb_per_s': size / 1e6 / total if total else None,
+        'peak_bytes': peak_memory(convert, html),
+    }
+
+
+def environment():
+    import bs4
+    from lxml import etree
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'bs4': bs4.__version__,
+        'lxml': '.'.join(map(str, etree.LXML_VERSION)),
+        'libxml2': '.'.join(map(str, etree.LIBXML_VERSION)),
+    }
+
+
+def format_row(result):
+    seconds = result['seconds']
+    return '%-18s %-17s %8.2f %9.4f %9.4f %11.4f %8.1f %8.1f' % (
+        result['document'], result['engine'], result['bytes'] / 1e6, seconds['cleanup_code'],
+        seconds['parse'], seconds['process_tag'], result['mb_per_s'] or 0, result['peak_bytes'] / 1e6)
+
+
+def compare(results, path):
+    """Print the change in total time against an earlier --output file."""
+    with open(path, encoding='utf-8') as f:
+        before = {(r['document'], r['engine']): r for r in json.load(f)['results']}
+    for result in results:
+        old = before.get((result['document'], result['engine']))
+        if old and old['bytes'] == result['bytes'] and result['total']:
+            print('%-18s %-17s %6.2fx' % (result['document'], result['engine'], old['total'] / result['total']))
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__)
+    parser.add_argument('-d', '--documents', nargs='+', choices=tuple(CORPUS), default=None,
+                        help="Documents to run. Defaults to all of them.")
+    parser.add_argument('-e', '--engines', nargs='+', choices=tuple(ENGINES), default=tuple(ENGINES),
+                        help="Engines to run. Defaults to all of them.")
+    parser.add_argument('-s', '--scale', type=float, default=1.0,
+                        help="Size multiplier for the generated documents.")
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help="Runs per document and engine; the fastest time of each phase is kept.")
+    parser.add_argument('-o', '--output', help="Write the results to this JSON file.")
+    parser.add_argument('-c', '--compare', help="A JSON file from an earlier run to report speedups against.")
+    args = parser.parse_args(argv)
+
+    corpus = generate(args.scale, args.documents)
+    results = []
+    print('%-18s %-17s %8s %9s %9s %11s %8s %8s' % (
+        'document', 'engine', 'MB', 'cleanup', 'parse', 'process_tag', 'MB/s', 'peak MB'))
+    for name, html in corpus.items():
+        for engine in args.engines:
+            results.append(bench(name, html, engine, max(1, args.repeat)))
+            print(format_row(results[-1]), flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'scale': args.scale, 'repeat': args.repeat,
+                       'results': results}, f, indent=1)
+    if args.compare:
+        print('\nspeedup over %s' % args.compare)
+        compare(results, args.compare)
+    return 0
@@ -1,9 +1,57 @@
-from bs4 import BeautifulSoup, NavigableString, Comment, Doctype
-from lxml.etree import HTMLParser
-HTMLParser = HTMLParser(remove_blank_text = True, recover = True, remove_comments = True, remove_pis = True)
+import codecs
+import importlib
+import sys
+import threading
+from math import inf
+from time import perf_counter
+
+class LazyModule:
+    """
+    A module imported by load() on first attribute access. Each attribute read is then bound on this object,
+    so later reads are plain attribute lookups. Keeps import markdownify from paying for a parser it may not use.
+    """
+    def __init__(self, load):
+        self._load = load
+    pass
+
+    def __getattr__(self, name):
+        value = getattr(self._load(), name)
+        setattr(self, name, value)
+        return value
+    pass
+pass
+
+def import_bs4():
+    import bs4
+    # bs4's comments and doctypes are skipped like lxml's comments, once bs4 is in use
+    SKIP_NODES.update((bs4.Comment, bs4.Doctype))
+    return bs4
+pass
+
+bs4   = LazyModule(import_bs4)
+etree = LazyModule(lambda: importlib.import_module("lxml.etree"))
+
+# lxml parsers keep state between feed() and close() and must not be shared between threads, so each
+# thread gets its own (BeautifulSoup makes a parser per document). Everything else in a conversion is local to the call, which makes the functions
+# below safe to call from any number of threads at once.
+PARSERS = threading.local()
+
+def etree_parser(encoding = None):
+    # Keeps blank text and comments, so the native lxml engine sees the same nodes BeautifulSoup does.
+    # huge_tree lifts libxml2's default nesting limit of 256 to 2048; deeper pages raise NestingTooDeep.
+    # One per encoding of bytes input (see lxml_encoding), as an lxml parser decodes with the one it was made with
+    if (parsers := getattr(PARSERS, "etree", None)) is None: parsers = PARSERS.etree = {}
+    if (parser := parsers.get(encoding)) is None:
+        parser = parsers[encoding] = etree.HTMLParser(recover = True, remove_pis = True, huge_tree = True,
+                                                      encoding = encoding)
+    return parser
+pass
 
 import re
-WHITESPACE_RE    = re.compile(r'[\t ]+')
+from functools import lru_cache, partial
+# Only runs of two or more and tabs change, so text without either is left alone
+WHITESPACE_RE    = re.compile(r'[\t ]{2,}|\t')
+UNESCAPE_RE      = re.compile(r'\\([!-/:-@\[-`{-~])')
 REMOVE_HTML_TAGS = re.compile("</?[a-z]{3,}[^>]{0,}>")
 CHECK_CODY_CODE  = re.compile(r'^[\s]{0,}(?:class="([^\s]{0,10})")?'\
                               r'>?([^\s]{0,10})(?:copy[\s]{0,}code)+', flags = re.IGNORECASE)
@@ -14,161 +62,325 @@ SPEECH_RE   = r'\"'
 PRE_TAG     = "<pre"
 PRE_END_TAG = "</pre>"
 IS_NESTED_NODE_SET  = frozenset(('ol', 'ul', 'li', 'table', 'thead', 'tbody', 'tfoot', 'tr', 'td', 'th',))
+PRESERVE_WHITESPACE_SET = frozenset(('pre', 'textarea',))
+TABLE_SECTIONS = frozenset(('thead', 'tbody', 'tfoot',))
+EMPTY_CELL     = "  |"   # what an empty <td> converts to
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
 
-def convert_h1(el, text, as_inline):
+def convert_h1(el, text, as_inline, ctx):
     text = text.strip() # [Fix newline start in header tags] (https://github.com/matthewwithanm/python-markdownify/pull/89)
     return f'{text}\n{"=" * len(text)}\n' if text else ""
 pass
 
-def convert_h2(el, text, as_inline):
+def convert_h2(el, text, as_inline, ctx):
     text = text.strip() # [Fix newline start in header tags] (https://github.com/matthewwithanm/python-markdownify/pull/89)
     return f'{text}\n{"-" * len(text)}\n' if text else ""
 pass
 
-def convert_a(el, text, as_inline):
-    if not text: return ""
-    prefix = " " if text[0]  == " " else ""
-    suffix = " " if text[-1] == " " else ""
-    if not (text := text.strip()): return ""
+def heading_converter(n, closed = False):
+    """ An ATX converter for <hn>: # marks before the text, and after it too if closed """
+    marks = "#" * n
+    if closed: return lambda el, text, c, ctx: text if c else f"{marks} {text.strip()} {marks}\n"
+    return lambda el, text, c, ctx: text if c else f"{marks} {text.strip()}\n"
+pass
 
-    el_get_attrs = el.attrs.get
-    href  = el_get_attrs("href",  "")
-    title = el_get_attrs("title", "")
-    if (text.replace(r'\_', '_') == href and not title):
-        return f"<{href}>"
+def link_converter(autolinks = True, default_title = False):
+    """ convert_a, optionally without the <href> shortcut, or with a link's href as its default title """
+    def convert_a(el, text, as_inline, ctx):
+        if not text: return ""
+        prefix = " " if text[0]  == " " else ""
+        suffix = " " if text[-1] == " " else ""
+        if not (text := text.strip()): return ""
 
-    title_part = f' "{title.replace(SPEECH, SPEECH_RE)}"' if title else ""
-    return f"{prefix}[{text}]({href}{title_part}){suffix}" if href else text
-pass
+        el_get_attrs = el.attrs.get
+        href  = el_get_attrs("href",  "")
+        title = el_get_attrs("title", "")
+        if autolinks and not default_title and ((UNESCAPE_RE.sub(r"\1", text) if "\\" in text else text) == href and not title):
+            return f"<{href}>"
 
-def convert_b(el, text, as_inline):
-    if not text: return ""
-    prefix = " " if text[0]  == " " else ""
-    suffix = " " if text[-1] == " " else ""
-    if not (text := text.strip()): return ""
-    return f'{prefix}**{text}**{suffix}'
+        if default_title and not title: title = href
+        title_part = f' "{title.replace(SPEECH, SPEECH_RE)}"' if title else ""
+        return f"{prefix}[{text}]({href}{title_part}){suffix}" if href else text
+    pass
+    return convert_a
 pass
 
-def convert_code(el, text, as_inline):
-    if not text: return ""
-    if el.parent.name == "pre": return text
-    prefix = " " if text[0]  == " " else ""
-    suffix = " " if text[-1] == " " else ""
-    if not (text := text.strip()): return ""
-    return f"{prefix}`{text}`{suffix}"
+def inline_converter(mark, name):
+    """ A converter that wraps text in mark, keeping a leading or trailing space outside it """
+    def convert(el, text, as_inline, ctx):
+        if not text: return ""
+        prefix = " " if text[0]  == " " else ""
+        suffix = " " if text[-1] == " " else ""
+        if not (text := text.strip()): return ""
+        return f"{prefix}{mark}{text}{mark}{suffix}"
+    pass
+    convert.__name__ = convert.__qualname__ = name
+    return convert
 pass
 
-def convert_del(el, text, as_inline):
-    if not text: return ""
-    prefix = " " if text[0]  == " " else ""
-    suffix = " " if text[-1] == " " else ""
-    if not (text := text.strip()): return ""
-    return f"{prefix}~~{text}~~{suffix}"
-pass
+convert_a   = link_converter()
+convert_b   = inline_converter("**", "convert_b")
+convert_del = inline_converter("~~", "convert_del")
+convert_em  = inline_converter("*",  "convert_em")
+convert_sub = inline_converter("",   "convert_sub")
 
-def convert_em(el, text, as_inline):
+def convert_code(el, text, as_inline, ctx):
     if not text: return ""
+    if ctx.parent.name == "pre": return text
     prefix = " " if text[0]  == " " else ""
     suffix = " " if text[-1] == " " else ""
     if not (text := text.strip()): return ""
-    return f"{prefix}*{text}*{suffix}"
+    return f"{prefix}`{text}`{suffix}"
 pass
 
-def convert_img(el, text, as_inline):
-    el_attrs_get = el.attrs.get
-    alt   = el_attrs_get("alt",   "")
-    src   = el_attrs_get("src",   "")
-    title = el_attrs_get("title", "")
-    if as_inline: return alt
-    title_part = f' "{title.replace(SPEECH, SPEECH_RE)}"' if title else ""
-    return f"![{alt}]({src}{title_part})"
+def image_converter(keep_inline_images_in = ()):
+    """ convert_img, keeping inline images (in a heading or cell) as images when their parent is one of these tags """
+    keep = frozenset(keep_inline_images_in)
+    def convert_img(el, text, as_inline, ctx):
+        el_attrs_get = el.attrs.get
+        alt   = el_attrs_get("alt",   "")
+        src   = el_attrs_get("src",   "")
+        title = el_attrs_get("title", "")
+        if as_inline and ctx.parent.name not in keep: return alt
+        title_part = f' "{title.replace(SPEECH, SPEECH_RE)}"' if title else ""
+        return f"![{alt}]({src}{title_part})"
+    pass
+    return convert_img
 pass
 
-def convert_list(el, text, as_inline):
+convert_img = image_converter()
+
+def convert_list(el, text, as_inline, ctx):
     # Converting a list to inline is undefined.
     # Ignoring convert_to_inline for list.
-    _next = el.next_sibling
-    while el:
-        if el.name == "li":
-             # remove trailing newline since nested
-            return f"\n{NEWLINE.join(f'{TAB}{x}' for x in text.split(NEWLINE)).rstrip() if text else ''}"
-        pass
-        el = el.parent
+    if ctx.in_li:
+        # remove trailing newline since nested
+        return f"\n{NEWLINE.join(f'{TAB}{x}' for x in text.split(NEWLINE)).rstrip() if text else ''}"
     pass
 
+    _next = ctx.next_sibling
     before_paragraph = (_next and _next.name != "ul" and _next.name != "ol")
     return f"{text}{NEWLINE if before_paragraph else ''}"
 pass
 
-def convert_li(el, text, as_inline):
-    parent = el.parent
-    if parent and parent.name == "ol":
-        start  = int(parent.attrs.get("start", 1))
-        bullet = f"{(start + parent.index(el))}."
-    else:
-        depth = -1
-        while el:
-            if el.name == "ul": depth += 1
-            el = el.parent
+def list_item_converter(bullets):
+    """ convert_li, with the bullets of unordered lists taken in turn by nesting depth """
+    n = len(bullets)
+    def convert_li(el, text, as_inline, ctx):
+        parent = ctx.parent
+        if parent and parent.name == "ol":
+            start  = int(parent.node.attrs.get("start", 1))
+            bullet = f"{(start + parent.i)}."
+        else:
+            bullet = bullets[(ctx.ul_depth - 1) % n]
         pass
+        return f"{bullet} {text.strip()}\n"
+    pass
+    return convert_li
+pass
+
+convert_li = list_item_converter("*+-")
 
-        i = depth % 3
-        if   i == 0: bullet = "*"
-        elif i == 1: bullet = "+"
-        else:        bullet = "-"
+def pre_converter(code_language = "", code_language_callback = None):
+    """
+    convert_pre, with the language taken from code_language_callback(el) instead of the first class, and
+    code_language when neither gives one
+    """
+    def convert_pre(el, text, as_inline, ctx):
+        if not text: return ""
+        if code_language_callback is not None:
+            language = code_language_callback(el)
+        else:
+            language = el.attrs.get("class")
+            language = language[0] if language else None
+        pass
+        return f"\n```{language or code_language}\n{text}\n```\n"
     pass
-    return f"{bullet} {text.strip()}\n"
+    return convert_pre
 pass
 
-def convert_pre(el, text, as_inline):
-    if not text: return ""
-    code_language = el.attrs.get("class")
-    code_language = "" if not code_language else code_language[0]
-    return f"\n```{code_language}\n{text}\n```\n"
+convert_pre = pre_converter()
+
+def paragraph_converter(width):
+    """ A converter for <p> that wraps each line at width, keeping the line breaks of <br> """
+    from textwrap import fill
+    def convert_p(el, text, as_inline, ctx):
+        if as_inline: return text
+        lines = []
+        for line in text.split(NEWLINE):
+            line     = line.lstrip()
+            stripped = line.rstrip()
+            # a trailing "  " or "\" is a <br>, which fill() would drop
+            wrapped  = fill(stripped, width, break_long_words = False, break_on_hyphens = False)
+            lines.append(wrapped + line[len(stripped):])
+        pass
+        return f"{NEWLINE.join(lines)}\n"
+    pass
+    return convert_p
 pass
 
-def convert_sub(el, text, as_inline):
-    if not text: return ""
-    prefix = " " if text[0]  == " " else ""
-    suffix = " " if text[-1] == " " else ""
-    if not (text := text.strip()): return ""
-    return f"{prefix}{text}{suffix}"
+class TableState:
+    """
+    What the rows of one table share, found once per table: whether it has a <thead> and any colspan or rowspan,
+    the rowspans still open in the current row group, and the rows kept for padding
+    """
+    __slots__ = ("has_thead", "has_spans", "spans", "group", "rows")
+
+    def __init__(self, ctx):
+        node = ctx.node
+        self.has_thead = any(el.name == "thead" for el in ctx.kids)
+        if isinstance(node, EtreeTag):
+            element = node.element
+            self.has_spans = element.find(".//*[@colspan]") is not None or element.find(".//*[@rowspan]") is not None
+        else:
+            self.has_spans = node.find(lambda tag: "colspan" in tag.attrs or "rowspan" in tag.attrs) is not None
+        pass
+        self.spans = {}     # column -> rows still covered by a rowspan from above
+        self.group = None   # the Context of the row group (thead, tbody, tfoot or the table) the spans are in
+        self.rows  = []     # (kind, cells), when padding
+    pass
+pass
+
+def table_state(table):
+    # Made by the first row and kept on the table's Context (the slot is left unset for every other element)
+    if (state := getattr(table, "table", None)) is None: state = table.table = TableState(table)
+    return state
+pass
+
+def span(value, limit, zero = 1):
+    """ A colspan or rowspan attribute as a count, clamped the way browsers do, with 0 counting as zero """
+    try:
+        n = int(value)
+    except (TypeError, ValueError):
+        return 1
+    return zero if n == 0 else min(max(n, 1), limit)
 pass
 
-def convert_tr(el, text, as_inline):
-    th = 0
-    td = 0
-    for children in el.descendants:
-        th += (children.name == "th")
-        td += (children.name == "td")
+def row_cells(ctx, text, state):
+    """
+    The cells of the row ctx (its converted td and th children) with colspans expanded and the columns still
+    covered by rowspans from above left empty. Returns (cells, row text, th count, td count).
+    """
+    if state.group is not ctx.parent:
+        # rowspans end with their row group
+        state.group = ctx.parent
+        state.spans = {}
+    pass
+    cells   = []
+    th = td = 0
+    spans   = state.spans
+    started = []
+    changed = False
+    # walk appended one part per child it did not skip, so children and parts pair up
+    for el, part in zip((el for el in ctx.kids if el and type(el) not in SKIP_NODES), ctx.parts):
+        if (name := el.name) != "td" and name != "th": continue
+        th += name == "th"
+        td += name == "td"
+        if spans:
+            while len(cells) in spans:
+                cells.append(EMPTY_CELL)
+                changed = True
+        pass
+        column = len(cells)
+        cells.append(part)
+        if (colspan := el.get("colspan")) is not None and (n := span(colspan, 1000)) > 1:
+            cells += [EMPTY_CELL] * (n - 1)
+            changed = True
+        # rowspan="0" spans the rest of the row group
+        if (rowspan := el.get("rowspan")) is not None and (n := span(rowspan, 65534, 65534)) > 1:
+            started += ((i, n - 1) for i in range(column, len(cells)))
+    pass
+
+    if spans:
+        while len(cells) <= max(spans):
+            cells.append(EMPTY_CELL)
+            changed = True
+        for i, rows in list(spans.items()):
+            if rows == 1: del spans[i]
+            else:         spans[i] = rows - 1
+    pass
+    if started: spans.update(started)
+    return cells, ("".join(cells) if changed else text), th, td
+pass
+
+def convert_tr(el, text, as_inline, ctx, pad = False):
+    parent   = ctx.parent
+    name     = parent.name
+    table    = parent if name == "table" else parent.parent if name in TABLE_SECTIONS else None
+    # a row or section outside any table has no state: no rowspans, no <thead>, no padding
+    state    = table_state(table) if table is not None and table.name == "table" else None
+    if state is not None and (pad or state.has_spans):
+        cells, text, th, td = row_cells(ctx, text, state)
+        n = len(cells)
+    else:
+        th = td = 0
+        for kid in ctx.kids:
+            th += kid.name == "th"
+            td += kid.name == "td"
+        n = th + td
     pass
-    n = th + td
     m = n-1 if n != 0 else 0
-    parent      = el.parent
-    name        = parent.name
-    no_previous = not el.previous_sibling
+    no_previous = not ctx.previous_sibling
     is_tbody    = name == "tbody"
 
     # [Support conversion of header rows in tables without th tag] (https://github.com/matthewwithanm/python-markdownify/pull/83)
     is_headrow = (td == 0) \
                  or (no_previous and not is_tbody) \
-                 or (no_previous and     is_tbody and parent.parent.find("thead") is None)
+                 or (no_previous and     is_tbody and not (state is not None and state.has_thead))
 
     if is_headrow and no_previous:
         # first row and is headline: print headline underline
-        return f"|{text}\n| {'--- | '*m}{'---' if n != 0 else ''} |\n"
-
+        kind = "head"
     elif (no_previous and ((name == "table") or (is_tbody and not parent.previous_sibling))):
         # first row, not headline, and:
         # - the parent is table or
         # - the parent is tbody at the beginning of a table.
         # print empty headline above this row
+        kind = "empty head"
+    else:
+        kind = "row"
+    pass
+
+    if pad and state is not None:
+        # the table lays out all its rows once their widths are known
+        state.rows.append((kind, cells))
+        return ""
+    pass
+    if kind == "head":
+        return f"|{text}\n| {'--- | '*m}{'---' if n != 0 else ''} |\n"
+    elif kind == "empty head":
         return f"| {' | '*m} |\n| {'--- | '*m}{'---' if n != 0 else ''} |\n|{text}\n"
     else:
         return f"|{text}\n"
 pass
 
-def convert_blockquote(el, text, as_inline):
+def convert_table_padded(el, text, as_inline, ctx):
+    """ A table whose columns are padded to a common width, from the rows convert_tr kept """
+    if (state := getattr(ctx, "table", None)) is None or not state.rows: return f"\n\n{text}\n"
+    rows   = [(kind, [cell[:-1].strip() if cell.endswith("|") else cell.strip() for cell in cells])
+              for kind, cells in state.rows]
+    n      = max(len(cells) for _, cells in rows)
+    widths = [3] * n
+    for _, cells in rows:
+        for i, cell in enumerate(cells):
+            if len(cell) > widths[i]: widths[i] = len(cell)
+    pass
+
+    def line(cells):
+        cells = cells + [""] * (n - len(cells))
+        return f"| {' | '.join(cell.ljust(width) for cell, width in zip(cells, widths))} |\n"
+    pass
+    separator = f"| {' | '.join('-' * width for width in widths)} |\n"
+    lines = []
+    for kind, cells in rows:
+        if   kind == "head":       lines += (line(cells), separator)
+        elif kind == "empty head": lines += (line([]), separator, line(cells))
+        else:                      lines.append(line(cells))
+    pass
+    return f"\n\n{text}{''.join(lines)}\n"
+pass
+
+def convert_blockquote(el, text, as_inline, ctx):
     if as_inline or not text: return text
     text = text.strip() # [Strip text before adding blockquote markers] (https://github.com/matthewwithanm/python-markdownify/pull/76)
     return f"\n{NEWLINE.join(f'> {x}' for x in text.split(NEWLINE))}\n"
@@ -199,114 +411,1121 @@ FUNCTIONS = {
     # [Fix newline start in header tags] (https://github.com/matthewwithanm/python-markdownify/pull/89)
     "h1"         : convert_h1,
     "h2"         : convert_h2,
-    "h3"         : lambda el, text, c: text if c else    f"### {text.strip()}\n",
-    "h4"         : lambda el, text, c: text if c else   f"#### {text.strip()}\n",
-    "h5"         : lambda el, text, c: text if c else  f"##### {text.strip()}\n",
-    "h6"         : lambda el, text, c: text if c else f"###### {text.strip()}\n",
-
-    "hr"         : lambda el, text, c: "\n\n---\n\n",
-    "table"      : lambda el, text, c: f"\n\n{text}\n",
-    "td"         : lambda el, text, c: f" {text.strip()} |", # [Tables not converted well - paragraphs] (https://github.com/matthewwithanm/python-markdownify/issues/90)
-    "th"         : lambda el, text, c: f" {text} |",
-    "br"         : lambda el, text, c: ""   if c else "  \n",
-    "p"          : lambda el, text, c: text if c else f"{text}\n",
+    "h3"         : lambda el, text, c, ctx: text if c else    f"### {text.strip()}\n",
+    "h4"         : lambda el, text, c, ctx: text if c else   f"#### {text.strip()}\n",
+    "h5"         : lambda el, text, c, ctx: text if c else  f"##### {text.strip()}\n",
+    "h6"         : lambda el, text, c, ctx: text if c else f"###### {text.strip()}\n",
+
+    "hr"         : lambda el, text, c, ctx: "\n\n---\n\n",
+    "table"      : lambda el, text, c, ctx: f"\n\n{text}\n",
+    "td"         : lambda el, text, c, ctx: f" {text.strip()} |", # [Tables not converted well - paragraphs] (https://github.com/matthewwithanm/python-markdownify/issues/90)
+    "th"         : lambda el, text, c, ctx: f" {text} |",
+    "br"         : lambda el, text, c, ctx: ""   if c else "  \n",
+    "p"          : lambda el, text, c, ctx: text if c else f"{text}\n",
+}
+
+# The same, with tables laid out with padded columns
+PADDED_TABLE_FUNCTIONS = {
+    **FUNCTIONS,
+    "tr"         : lambda el, text, c, ctx: convert_tr(el, text, c, ctx, pad = True),
+    "table"      : convert_table_padded,
 }
 
-def process_tag(node, as_inline, children_only = False):
-    text = ""
+class EtreeString(str):
+    """ An lxml .text or .tail chunk standing in for a NavigableString """
+    name = None
+pass
+
+class EtreeComment(EtreeString):
+    """ An lxml comment standing in for a bs4 Comment """
+pass
+
+class EtreeTag:
+    """ An lxml element standing in for a bs4 Tag, with only what the converters touch """
+    __slots__ = ("element", "name", "preserve", "_attrs")
+
+    def __init__(self, element, preserve = False):
+        self.element  = element
+        self.name     = name = element.tag
+        self.preserve = preserve or name in PRESERVE_WHITESPACE_SET
+        self._attrs   = None
+    pass
+
+    @property
+    def attrs(self):
+        if (attrs := self._attrs) is None:
+            # bs4 splits class into a list of names
+            attrs = self._attrs = dict(self.element.attrib)
+            if "class" in attrs: attrs["class"] = attrs["class"].split()
+        return attrs
+    pass
+
+    @property
+    def descendants(self):
+        for element in self.element.iterdescendants():
+            if isinstance(element.tag, str): yield EtreeTag(element)
+    pass
+
+    def get(self, key, default = None):
+        return self.element.get(key, default)
+    pass
+
+    def has_attr(self, key):
+        return key in self.attrs
+    pass
+
+    def __getitem__(self, key):
+        return self.attrs[key]
+    pass
+
+    def find(self, name):
+        return self.element.find(f".//{name}")
+    pass
+pass
+
+def etree_string(text, preserve):
+    # Like bs4, collapse strings of nothing but ASCII whitespace to one newline or space outside <pre>/<textarea>
+    if not preserve and not text.strip(ASCII_SPACES): text = "\n" if "\n" in text else " "
+    return EtreeString(text)
+pass
+
+def drop_nested_whitespace(contents, string_type):
+    """
+    contents without the whitespace-only strings (of string_type) that are first, last, or next to a nested node.
+    Decides each string as removing them one by one in order would: against the previous child still kept and
+    the next child, and with the child after a removed string kept unchecked.
+    """
+    kept = []
+    last = len(contents) - 1
+    skip = False
+    for i, el in enumerate(contents):
+        if skip:
+            skip = False
+        elif isinstance(el, string_type) and el.isspace() and (
+            (not kept     or kept[-1].name        in IS_NESTED_NODE_SET) or \
+            (i == last    or contents[i+1].name   in IS_NESTED_NODE_SET)
+        ):
+            skip = True
+            continue
+        kept.append(el)
+    pass
+    return kept
+pass
+
+def etree_children(node):
+    """ The children of an EtreeTag as bs4 would list them: text, then every child followed by its tail """
+    element  = node.element
+    preserve = node.preserve
+    contents = [etree_string(element.text, preserve)] if element.text else []
+    append   = contents.append
+    for child in element:
+        tag = child.tag
+        if isinstance(tag, str):   append(EtreeTag(child, preserve))
+        elif tag is etree.Comment: append(EtreeComment(child.text or ""))
+        if child.tail: append(etree_string(child.tail, preserve))
+    pass
+
+    # Same rule as soup_children: drop whitespace-only text nodes in purely nested nodes
+    if node.name in IS_NESTED_NODE_SET: return drop_nested_whitespace(contents, EtreeString)
+    return contents
+pass
+
+def soup_children(node):
+    """
+    The children of a bs4 Tag, less whitespace-only text nodes in purely nested nodes. They are skipped
+    rather than extracted, so the tree is left as it was and can be converted again, or from several threads.
+    """
+    if node.name in IS_NESTED_NODE_SET: return drop_nested_whitespace(node.contents, bs4.NavigableString)
+    return node.contents
+pass
+
+def children_as_inline(name, as_inline, children_only):
     # markdown headings or cells can't include
     # block elements (elements w/newlines)
-    name = node.name
-    isHeading = ("h1" <= name <= "h6")
-    isCell = (name == "td" or name == "th")
-    convert_children_as_inline = as_inline or (not children_only and (isHeading or isCell))
-
-    # Remove whitespace-only textnodes in purely nested nodes
-    if name in IS_NESTED_NODE_SET:
-        for el in node.children:
-            # Only extract (remove) whitespace-only text node if any of the conditions is true:
-            # - el is the first element in its parent
-            # - el is the last  element in its parent
-            # - el is adjacent to an nested node
-            if isinstance(el, NavigableString) and el.isspace() and ( \
-                (not (_prev := el.previous_sibling) or _prev.name in IS_NESTED_NODE_SET) or \
-                (not (_next := el.next_sibling)     or _next.name in IS_NESTED_NODE_SET)
-            ):
-                el.extract()
-
-    # Convert the children first
-    for el in node.children:
-        if not el or isinstance(el, (Comment, Doctype)):
-            continue
-        elif isinstance(el, NavigableString):
-            text += process_text(el)
+    return as_inline or (not children_only and (("h1" <= name <= "h6") or name == "td" or name == "th"))
+pass
+
+class Context:
+    """
+    An element the walk is inside of, linked to its parent's Context. Carries what converters would
+    otherwise find by climbing the tree: list nesting, the child index (the ordered-list counter),
+    siblings, whether text is inline or kept verbatim.
+    """
+    __slots__ = ("node", "name", "parent", "kids", "i", "parts", "as_inline", "inline", "convert",
+                 "ul_depth", "in_li", "raw", "table")
+
+    def __init__(self, node, parent, as_inline, children_only, kids):
+        self.node      = node
+        self.name      = name = node.name
+        self.parent    = parent
+        self.kids      = kids
+        self.i         = -1   # index of the child being converted
+        self.parts     = []
+        self.as_inline = as_inline
+        self.inline    = children_as_inline(name, as_inline, children_only)
+        self.convert   = not children_only
+        if parent is None:
+            self.ul_depth = int(name == "ul")
+            self.in_li    = name == "li"
+            self.raw      = name == "pre"
         else:
-            text += process_tag (el, convert_children_as_inline)
+            self.ul_depth = parent.ul_depth + (name == "ul")
+            self.in_li    = parent.in_li or name == "li"
+            # Dont remove any whitespace when handling pre or code in pre
+            self.raw      = name == "pre" or (name == "code" and parent.name == "pre")
+        pass
+    pass
+
+    @property
+    def previous_sibling(self):
+        if (parent := self.parent) is None or parent.i == 0: return None
+        return parent.kids[parent.i - 1]
+    pass
+
+    @property
+    def next_sibling(self):
+        if (parent := self.parent) is None or (i := parent.i + 1) == len(parent.kids): return None
+        return parent.kids[i]
+    pass
+pass
+
+# The exact types of the nodes that are not converted; import_bs4 adds bs4's Comment and Doctype
+SKIP_NODES = {EtreeComment}
+
+class LimitExceeded(Exception):
+    """ Raised when a conversion hits one of its Limits; limit names it (e.g. "max_nodes") and value is its setting """
+    def __init__(self, limit, value):
+        super().__init__(limit, value)
+        self.limit = limit
+        self.value = value
+    pass
+
+    def __str__(self):
+        return f"conversion stopped at {self.limit}={self.value!r}"
+    pass
+pass
+
+class PartialMarkdown(str):
+    """ The Markdown converted before a limit was hit, with truncated naming the limit """
+    def __new__(cls, markdown, truncated):
+        self = super().__new__(cls, markdown)
+        self.truncated = truncated
+        return self
+    pass
+
+    def __reduce__(self):
+        return PartialMarkdown, (str(self), self.truncated)
+    pass
+pass
+
+class Limits:
+    """
+    Budgets for each conversion it is passed to: max_bytes of UTF-8 input, max_nodes elements and text nodes
+    converted, max_depth of element nesting and timeout seconds of wall-clock time, each unlimited if None.
+    When one is hit, LimitExceeded is raised, or with truncate=True, the conversion stops and returns what it
+    converted so far as a PartialMarkdown. The timeout is checked every 1024 nodes, so a single converter call,
+    or the parse, is never interrupted.
+    """
+    __slots__ = ("max_bytes", "max_nodes", "max_depth", "timeout", "truncate")
+
+    def __init__(self, max_bytes = None, max_nodes = None, max_depth = None, timeout = None, truncate = False):
+        self.max_bytes = max_bytes
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.timeout   = timeout
+        self.truncate  = truncate
+    pass
+
+    def __repr__(self):
+        return f"Limits({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+    pass
+pass
+
+class Guard:
+    """ What one conversion has spent of its Limits, and the limit that stopped it, if any """
+    __slots__ = ("limits", "nodes", "max_nodes", "max_depth", "deadline", "truncated")
+
+    def __init__(self, limits, start):
+        self.limits    = limits
+        self.nodes     = 0
+        self.max_nodes = inf if limits.max_nodes is None else limits.max_nodes
+        self.max_depth = inf if limits.max_depth is None else limits.max_depth
+        self.deadline  = inf if limits.timeout   is None else start + limits.timeout
+        self.truncated = None
+    pass
+
+    def spend(self, depth):
+        """ Count a node at depth; True once the conversion is to stop """
+        if self.truncated is not None: return True
+        self.nodes = nodes = self.nodes + 1
+        if   nodes > self.max_nodes: return self.stop("max_nodes")
+        elif depth > self.max_depth: return self.stop("max_depth")
+        elif not nodes & 1023 and perf_counter() > self.deadline: return self.stop("timeout")
+        return False
+    pass
+
+    def stop(self, limit):
+        if not self.limits.truncate: raise LimitExceeded(limit, getattr(self.limits, limit))
+        self.truncated = limit
+        return True
+    pass
+pass
+
+def utf8_prefix(text, max_bytes):
+    """ The start of text that fits in max_bytes, of UTF-8 for a str, or None if all of it does """
+    if isinstance(text, EncodedHTML): return text.prefix(max_bytes)
+    if len(text) * 4 <= max_bytes: return None   # no character takes more than 4 bytes
+    # max_bytes + 1 characters are at least max_bytes + 1 bytes, so a long text is never encoded whole
+    data = text[:max_bytes + 1].encode("utf-8", "surrogatepass")
+    if len(data) <= max_bytes: return None
+    return data[:max_bytes].decode("utf-8", "ignore")
+pass
+
+def context_depth(ctx):
+    """ The number of elements ctx is nested in """
+    depth = 0
+    while (ctx := ctx.parent) is not None: depth += 1
+    return depth
+pass
+
+class Sink(list):
+    """
+    The parts of the Contexts whose Markdown goes straight to a sink: appending a part writes it out, so the
+    list stays empty. The root's and, below it, those of every element without a converter, which would
+    only join them.
+    """
+    __slots__ = ("append",)
+
+    def __init__(self, write):
+        super().__init__()
+        self.append = lambda text: text and write(text)
+    pass
+pass
+
+def sink_writer(sink):
+    """ The function writing Markdown to sink: a text file object (or anything with write), a list or a callable """
+    if hasattr(sink, "write"):  return sink.write
+    if isinstance(sink, list):  return sink.append
+    if callable(sink):          return sink
+    raise TypeError(f"sink must be a file object, a list or a callable, not {type(sink).__name__}")
+pass
+
+def walk(ctx, children, functions = None, convert_text = None, fragments = None, guard = None):
+    """
+    Convert ctx's element and everything below it. Walks with an explicit stack of Contexts instead of
+    recursing, so nesting depth is unbounded, and collects each element's fragments in a list joined once.
+    functions and convert_text replace FUNCTIONS and process_text, e.g. with instrumented versions.
+    fragments (a FragmentCache) reuses the Markdown of subtrees converted before in the same context.
+    guard (a Guard) counts every node against its Limits; once it stops the walk, each open element is
+    converted with the children it has so far. If ctx's parts are a Sink, everything converted is written to
+    it as soon as no converter is left to take it, and "" is returned.
+    """
+    functions    = FUNCTIONS    if functions    is None else functions   # empty when convert=[]
+    convert_text = process_text if convert_text is None else convert_text
+    pending      = {}   # id(node) -> fragment key, for the open subtrees that missed the cache
+    root  = ctx
+    depth = 0 if guard is None else context_depth(ctx)   # only the guard needs it right
+    sink  = ctx.parts if type(ctx.parts) is Sink else None
+    while True:
+        if (i := ctx.i + 1) < len(kids := ctx.kids):
+            ctx.i = i
+            el = kids[i]
+            if not el or type(el) in SKIP_NODES:
+                continue
+            elif guard is not None and guard.spend(depth + (not isinstance(el, str))):
+                ctx.i = len(kids)
+            elif isinstance(el, str):
+                ctx.parts.append(convert_text(el, ctx))
+            else:
+                if fragments is not None and (key := fragments.fragment_key(el, ctx)) is not None:
+                    if (markdown := fragments.get(key)) is not None:
+                        ctx.parts.append(markdown)
+                        continue
+                    pending[id(el)] = key
+                pass
+                parent = ctx
+                ctx    = Context(el, parent, parent.inline, False, children(el))
+                depth += 1
+                # without a converter, the element's Markdown is its children's, which can go out as they come
+                if sink is not None and parent.parts is sink and el.name not in functions and id(el) not in pending:
+                    ctx.parts = sink
+            continue
+        pass
+
+        text = "".join(ctx.parts)
+        if ctx.convert and (function := functions.get(ctx.name)):
+            text = function(ctx.node, text, ctx.as_inline, ctx)
+        if pending and (key := pending.pop(id(ctx.node), None)) is not None:
+            # a subtree cut short by the guard is not what the next page would make of it
+            if guard is None or guard.truncated is None: fragments.put(key, text)
+        if ctx is root: return text
+        ctx = ctx.parent
+        depth -= 1
+        ctx.parts.append(text)
+    pass
+pass
 
-    if not children_only and name in FUNCTIONS:
-        text = FUNCTIONS[name](node, text, as_inline)
+def tree_children(node):
+    if isinstance(node, EtreeTag): return etree_children
+    import_bs4()   # a soup parsed by the caller may be the first this module sees
+    return soup_children
+pass
 
-    return text
+def process_tag(node, as_inline, children_only = False, functions = None, convert_text = None, fragments = None,
+                guard = None, write = None, parent = None):
+    """
+    Convert node, and return its Markdown, or with write, write it out as it is converted. parent is the
+    Context node is converted in, if it is not the root.
+    """
+    children = tree_children(node)
+    ctx = Context(node, parent, as_inline, children_only, children(node))
+    if write is None: return walk(ctx, children, functions, convert_text, fragments, guard)
+    # a root with a converter (a select match) needs all of its Markdown before the converter can run
+    if not children_only and node.name in (FUNCTIONS if functions is None else functions):
+        if (text := walk(ctx, children, functions, convert_text, fragments, guard)): write(text)
+        return ""
+    pass
+    ctx.parts = Sink(write)
+    return walk(ctx, children, functions, convert_text, fragments, guard)
+pass
+
+def process_children(ctx, stop, children, functions = None, convert_text = None, fragments = None, guard = None):
+    """ Convert ctx's children after ctx.i, up to but not including index stop """
+    parts = []
+    depth = 0 if guard is None else context_depth(ctx)
+    while (i := ctx.i + 1) < stop:
+        ctx.i = i
+        el = ctx.kids[i]
+        if not el or type(el) in SKIP_NODES:
+            continue
+        elif guard is not None and guard.spend(depth + (not isinstance(el, str))):
+            ctx.i = stop - 1
+        elif isinstance(el, str):
+            parts.append((convert_text or process_text)(el, ctx))
+        else:
+            parts.append(walk(Context(el, ctx, ctx.inline, False, children(el)), children, functions, convert_text,
+                              fragments, guard))
+    pass
+    return "".join(parts)
 pass
 
-def process_text(el):
-    text = str(el)
-    if not (parent := el.parent): return text
-    name    = parent.name
-    _next   = el.next_sibling
-    is_pre  = name == "pre"
-    is_code = name == "code"
+def text_converter(escapes):
+    """
+    A process_text that escapes each character in escapes with a backslash. The replacements are worked out
+    once here; per text node, only the characters actually present are replaced, and whitespace is only
+    collapsed when there is a run or a tab to collapse.
+    """
+    # a backslash goes first, so it does not double the escapes of the others
+    replacements = tuple((c, "\\" + c) for c in sorted(set(escapes), key = lambda c: (c != "\\", c)))
+
+    def process_text(el, ctx):
+        """ Convert a text node; ctx is its parent's Context """
+        text = str(el)
+        name = ctx.name
+
+        if not ctx.raw and ("  " in text or TAB in text):
+            text = WHITESPACE_RE.sub(" ", text)
+
+        if name != "pre" and name != "code":
+            for c, escaped in replacements:
+                if c in text: text = text.replace(c, escaped)
 
-    # Dont remove any whitespace when handling pre or code in pre
-    if not (is_pre or (is_code and parent.parent.name == "pre")):
-        text = WHITESPACE_RE.sub(" ", text)
+        # remove trailing whitespaces if any of the following condition is true:
+        # - current text node is the last node in li
+        # - current text node is followed by an embedded list
+        if name == "li":
+            _next = ctx.kids[i] if (i := ctx.i + 1) < len(ctx.kids) else None
+            if not _next or _next.name == "ul" or _next.name == "ol":
+                text = text.rstrip()
 
-    if not is_pre and not is_code:
-        if "_" in text or "*" in text:
-            text = text.replace("_", r"\_").replace("*", r"\*")
+        return text
+    pass
+    return process_text
+pass
+
+process_text = text_converter("_*")
 
-    # remove trailing whitespaces if any of the following condition is true:
-    # - current text node is the last node in li
-    # - current text node is followed by an embedded list
-    if ((name == "li") and (not _next or _next.name == "ul" or _next.name == "ol")):
-        text = text.rstrip()
+def clean_code(code):
+    """ The opening of a <pre> block and its code, from what follows "<pre" up to "</pre>" """
+    code = REMOVE_HTML_TAGS.sub("", code)
 
-    return text
+    """ Check if Copy Code exists """
+    if (attrs := CHECK_CODY_CODE.match(code)):
+        # pythonCopy Code takes priority over class="python"
+        language = attrs.group(2) or attrs.group(1)
+        return f'<pre class="{language}">', code[attrs.end():]
+    return PRE_TAG, code
 pass
 
 def cleanup_code(text):
     """ First cleanup code sections by deleting <span> <div> etc """
-    i = 0
+    if isinstance(text, EncodedHTML): return text.cleanup_code()
+    # One pass: copy the text between <pre> blocks and the cleaned blocks into parts, joined once at the end
+    parts  = []
+    copied = i = 0
     while (code_start := text.find(PRE_TAG, i)) != -1:
 
         start = code_start + len(PRE_TAG)
         if (code_end := text.find(PRE_END_TAG, start)) == -1: break
-        code = REMOVE_HTML_TAGS.sub("", text[start : code_end])
-
-        """ Check if Copy Code exists """
-        if (attrs := CHECK_CODY_CODE.match(code)):
-            # pythonCopy Code takes priority over class="python"
-            language = attrs.group(2) or attrs.group(1)
-            pre = f'<pre class="{language}">'
-            code = code[attrs.span(0)[1]:]
+        parts += (text[copied : code_start], *clean_code(text[start : code_end]))
+        copied = code_end
+        i = code_end + len(PRE_END_TAG)
+    pass
+    if not parts: return text
+    parts.append(text[copied:])
+    return "".join(parts)
+pass
+
+PRE_HOLD = 1 << 26   # how much of an unclosed <pre> block iter_cleanup_code holds back
+
+def iter_cleanup_code(chunks, encoding = None, max_pre = PRE_HOLD):
+    """
+    cleanup_code over a stream of chunks, holding back any <pre> block that is not closed yet, up to max_pre
+    characters of it: a longer one goes out as it is, like an unclosed one. With encoding, the chunks are
+    bytes in it (one keeping "<pre" as in ASCII), and so are the chunks yielded.
+    """
+    if encoding is None:
+        pre_tag, pre_end_tag, clean = PRE_TAG, PRE_END_TAG, cleanup_code
+    else:
+        pre_tag, pre_end_tag = PRE_TAG.encode(), PRE_END_TAG.encode()
+        clean = lambda data: EncodedHTML(data, encoding).cleanup_code().bytes()
+    pass
+    empty   = pre_tag[:0]
+    pending = []     # the text held back, joined once it can go out
+    held    = 0      # its length
+    tail    = None   # while a <pre> block is open, its end that may start "</pre>"
+    for chunk in chunks:
+        i = 0
+        if tail is not None:
+            # only the new text can close the block, so the held one is not scanned again
+            tail += chunk
+            if (found := tail.find(pre_end_tag)) == -1:
+                pending.append(chunk)
+                held += len(chunk)
+                tail  = tail[1 - len(pre_end_tag):]
+                if held > max_pre:
+                    yield from pending
+                    pending, held, tail = [], 0, None
+                pass
+                continue
+            pass
+            i = held + len(chunk) - len(tail) + found + len(pre_end_tag)
+        pass
+        text = empty.join((*pending, chunk))
+        while (code_start := text.find(pre_tag, i)) != -1:
+            if (code_end := text.find(pre_end_tag, code_start + len(pre_tag))) == -1:
+                tail = text[max(code_start + len(pre_tag), len(text) + 1 - len(pre_end_tag)):]
+                break
+            pass
+            i = code_end + len(pre_end_tag)
+        else:
+            # keep enough back to catch a "<pre" split across chunks
+            code_start = max(i, len(text) - len(pre_tag) + 1)
+            tail = None
+        pass
+        if code_start: yield clean(text[:code_start])
+        pending = [text[code_start:]]
+        held    = len(text) - code_start
+    pass
+    # an unclosed <pre> stops cleanup_code too, so the rest goes out as is
+    if tail is not None: yield from pending
+    elif pending and pending[0]: yield clean(pending[0])
+pass
+
+PRE_TAG_RE     = re.compile(PRE_TAG.encode())
+PRE_END_TAG_RE = re.compile(PRE_END_TAG.encode())
+FEED_SIZE      = 1 << 16
+BOMS           = ((codecs.BOM_UTF8, "utf-8"), (codecs.BOM_UTF16_LE, "utf-16-le"), (codecs.BOM_UTF16_BE, "utf-16-be"))
+META_CHARSET   = re.compile(rb'<meta[^>]*?charset\s*=\s*["\']?\s*([-\w.:]+)', flags = re.IGNORECASE)
+
+@lru_cache(maxsize = 64)
+def encoding_name(label):
+    """ Python's name for an encoding label, read as browsers read it, or None if it names none """
+    try:
+        name = codecs.lookup(label.strip()).name
+    except LookupError:
+        return None
+    # browsers read both as windows-1252, which only differs in the C1 controls no page means
+    return "cp1252" if name in ("ascii", "iso8859-1") else name
+pass
+
+@lru_cache(maxsize = 64)
+def lxml_encoding(encoding):
+    """ The name libxml2 knows encoding (a Python name) by, or None if it does not know it """
+    for label in (encoding, encoding.replace("_", "-")):
+        try:
+            etree.HTMLParser(encoding = label)
+        except LookupError:
+            continue
+        return label
+    pass
+    return None
+pass
+
+def ascii_compatible(encoding):
+    """ Whether encoding keeps "<pre" as in ASCII, so cleanup_code can find it in the bytes """
+    return PRE_TAG.encode(encoding, "replace") == PRE_TAG.encode()
+pass
+
+def sniff_encoding(data, hint = None):
+    """
+    The encoding of HTML bytes and the length of their byte order mark, as a browser decides: by the BOM,
+    then hint (e.g. the charset of a Content-Type header), then a <meta> charset in the first 1024 bytes,
+    then UTF-8. Unknown labels are passed over.
+    """
+    for bom, encoding in BOMS:
+        if data[:len(bom)] == bom: return encoding, len(bom)
+    if hint is not None and (encoding := encoding_name(hint)) is not None: return encoding, 0
+    if (match := META_CHARSET.search(data[:1024])) and (encoding := encoding_name(match[1].decode())) is not None:
+        # bytes a <meta> could be read from are not UTF-16, whatever it says
+        return "utf-8" if encoding.startswith("utf-16") else encoding, 0
+    return "utf-8", 0
+pass
+
+class EncodedHTML:
+    """
+    HTML as bytes in an encoding that keeps "<pre" as in ASCII: any bytes-like object (bytes, memoryview, mmap),
+    left undecoded until the parser reads it. Only the <pre> blocks are decoded to clean them, so a page without
+    any is never copied whole.
+    """
+    __slots__ = ("data", "encoding")
+
+    def __init__(self, data, encoding):
+        self.data     = data
+        self.encoding = encoding
+    pass
+
+    def __len__(self):
+        return len(self.data)
+    pass
+
+    def decode(self):
+        return str(self.data, self.encoding, "replace")
+    pass
+
+    def bytes(self):
+        return self.data if isinstance(self.data, bytes) else bytes(self.data)
+    pass
+
+    def chunks(self, size = FEED_SIZE):
+        """ The data in bytes of size, at least one, for parsers that take nothing else """
+        view = memoryview(self.data).cast("B")
+        for i in range(0, len(view) or 1, size): yield bytes(view[i : i + size])
+    pass
+
+    def prefix(self, max_bytes):
+        """ The first max_bytes, or None if the data is no longer """
+        if len(self.data) <= max_bytes: return None
+        return EncodedHTML(memoryview(self.data).cast("B")[:max_bytes], self.encoding)
+    pass
+
+    def cleanup_code(self):
+        """ cleanup_code, with each <pre> block decoded, cleaned and encoded again """
+        data     = self.data
+        encoding = self.encoding
+        parts    = []
+        copied = i = 0
+        while (code_start := PRE_TAG_RE.search(data, i)) is not None:
+            code_start = code_start.start()
+            start = code_start + len(PRE_TAG)
+            if (code_end := PRE_END_TAG_RE.search(data, start)) is None: break
+            code_end = code_end.start()
+            pre, code = clean_code(str(data[start : code_end], encoding, "replace"))
+            parts += (data[copied : code_start], pre.encode(encoding), code.encode(encoding, "xmlcharrefreplace"))
+            copied = code_end
+            i = code_end + len(PRE_END_TAG)
+        pass
+        if not parts: return self
+        parts.append(data[copied:])
+        return EncodedHTML(b"".join(parts), encoding)
+    pass
+pass
+
+def html_input(text, hint = None):
+    """
+    text as the parsers take it: a str as it is, and bytes-like text as an EncodedHTML after its BOM, in
+    sniff_encoding's encoding with hint, or decoded if that is not ascii_compatible (e.g. UTF-16)
+    """
+    if isinstance(text, (str, EncodedHTML)): return text
+    encoding, bom = sniff_encoding(text, hint)
+    html = EncodedHTML(memoryview(text).cast("B")[bom:] if bom else text, encoding)
+    return html if ascii_compatible(encoding) else html.decode()
+pass
+
+def is_xpath(select):
+    # no CSS selector starts with either
+    return select.startswith(("/", "("))
+pass
+
+def etree_selector(select):
+    """ select compiled for lxml, an XPath or a CSS selector (which needs the cssselect package), once per thread """
+    if (selectors := getattr(PARSERS, "selectors", None)) is None or len(selectors) > 128:
+        selectors = PARSERS.selectors = {}
+    if (selector := selectors.get(select)) is None:
+        if is_xpath(select):
+            selector = etree.XPath(select)
+        else:
+            from lxml.cssselect import CSSSelector
+            selector = CSSSelector(select, translator = "html")
+        pass
+        selectors[select] = selector
+    pass
+    return selector
+pass
+
+def outermost(matches, parents):
+    """ The matches not inside another match, in document order """
+    ids = {id(el) for el in matches}
+    return [el for el in matches if not any(id(parent) in ids for parent in parents(el))]
+pass
+
+def etree_matches(root, select):
+    """ The outermost elements below root (an lxml element) that select matches """
+    if not isinstance(matches := etree_selector(select)(root), list):
+        raise ValueError(f"select must match elements, not give {matches!r}")
+    return outermost([el for el in matches if isinstance(el, etree._Element) and isinstance(el.tag, str)],
+                     etree._Element.iterancestors)
+pass
+
+def soup_matches(soup, select):
+    """ The outermost elements of a BeautifulSoup or Tag that the CSS selector select matches """
+    if is_xpath(select): raise ValueError("XPath needs an lxml engine or tree; BeautifulSoup is searched with CSS")
+    return outermost(soup.select(select), lambda el: el.parents)
+pass
+
+class NestingTooDeep(ValueError):
+    """
+    Raised when libxml2 stopped at its nesting limit (2048 levels, even with huge_tree), dropping the
+    rest of the document
+    """
+pass
+
+def stopped_nesting(parser):
+    # the error that ends the parse is the last one it logged
+    return (error := parser.feed_error_log.last_error) is not None and error.type == etree.ErrorTypes.ERR_RESOURCE_LIMIT
+pass
+
+def feed_lxml(text):
+    """ The lxml tree of text, or NestingTooDeep if libxml2 could not build all of it """
+    # feed() rather than fromstring(), which rejects str input carrying an <?xml encoding=...?> declaration
+    if not isinstance(text, EncodedHTML):
+        parser, chunks = etree_parser(), (text,)
+    elif (encoding := lxml_encoding(text.encoding)) is None:
+        parser, chunks = etree_parser(), (text.decode(),)
+    else:
+        # libxml2 decodes as it parses, so the bytes are never copied whole
+        parser, chunks = etree_parser(encoding), text.chunks()
+    pass
+    try:
+        for chunk in chunks: parser.feed(chunk)
+    finally:
+        # close() even after a failed feed(), so the next document on this thread starts clean
+        root = parser.close()
+    pass
+    if stopped_nesting(parser): raise NestingTooDeep("the HTML nests deeper than libxml2 can parse")
+    return root
+pass
+
+def parse_lxml(text, select = None):
+    try:
+        root = feed_lxml(text)
+    except NestingTooDeep:
+        # BeautifulSoup builds its tree from lxml's parse events, which go on past the limit
+        if select is None: return parse_fast(text)
+        return soup_selected(parse_fast(text), select)
+    pass
+    if root is None: return None
+    if select is not None:
+        # the matches are moved to a <body> of their own, so the walk never sees the rest of the page
+        if not (matches := etree_matches(root, select)): return None
+        root = etree.Element("body")
+        for el in matches:
+            root.append(el)
+            el.tail = None
+        pass
+    pass
+    return EtreeTag(root)
+pass
+
+def parse_fast(text, select = None):
+    # selected in lxml's tree, where XPath works, and converted from it: a soup of the page would only be
+    # built to be thrown away but for the matches, which are the same elements in the same places
+    if select is not None: return parse_lxml(text, select)
+    if isinstance(text, EncodedHTML):
+        if (encoding := lxml_encoding(text.encoding)) is not None:
+            return bs4.BeautifulSoup(text.bytes(), "lxml", from_encoding = encoding)
+        text = text.decode()
+    pass
+    return bs4.BeautifulSoup(text, "lxml")
+pass
+
+def soup_selected(soup, select):
+    """ A BeautifulSoup of the elements of soup that select matches, moved out of it """
+    root = bs4.BeautifulSoup("", "html.parser")
+    for el in soup_matches(soup, select): root.append(el.extract())
+    return root
+pass
+
+def parse_html(text, select = None):
+    if isinstance(text, EncodedHTML): text = text.decode()
+    soup = bs4.BeautifulSoup(text, "html.parser")
+    if select is None: return soup
+    return soup_selected(soup, select)
+pass
+
+def select_parse(parse, select):
+    """ parse, narrowed to the elements select matches """
+    if select is None: return parse
+    if parse is parse_html and is_xpath(select):
+        raise ValueError("XPath needs an lxml engine; the html.parser engine takes CSS selectors")
+    return partial(parse, select = select)
+pass
+
+# heading_style
+ATX        = "atx"
+ATX_CLOSED = "atx_closed"
+UNDERLINED = "underlined"   # h1 and h2 underlined, the rest ATX
+SETEXT     = UNDERLINED
+# newline_style
+SPACES     = "spaces"
+BACKSLASH  = "backslash"
+# strong_em_symbol
+ASTERISK   = "*"
+UNDERSCORE = "_"
+
+DEFAULT_OPTIONS = {
+    "autolinks"              : True,         # write a link whose text is its href as <href>
+    "bullets"                : "*+-",        # unordered list bullets, in turn by nesting depth
+    "code_language"          : "",           # language of a <pre> that names none
+    "code_language_callback" : None,         # el -> language of a <pre>, instead of its first class
+    "convert"                : None,         # only convert these tags
+    "default_title"          : False,        # give a link without a title its href as title
+    "escape_asterisks"       : True,         # escape * as \*
+    "escape_underscores"     : True,         # escape _ as \_
+    "escape_chars"           : "",           # further characters to escape, e.g. "[]#`>|"
+    "heading_style"          : UNDERLINED,   # ATX, ATX_CLOSED or UNDERLINED (SETEXT)
+    "keep_inline_images_in"  : (),           # parent tags in which inline images stay images
+    "newline_style"          : SPACES,       # <br> as two spaces or a backslash before the newline
+    "pad_tables"             : False,        # pad table columns to a common width
+    "select"                 : None,         # only convert what this XPath or CSS selector matches
+    "strip"                  : None,         # do not convert these tags
+    "strong_em_symbol"       : ASTERISK,     # ASTERISK or UNDERSCORE
+    "sub_symbol"             : "",           # written around <sub> text
+    "sup_symbol"             : "",           # written around <sup> text
+    "wrap"                   : False,        # wrap paragraphs...
+    "wrap_width"             : 80,           # ...at this width
+}
+TAG_SET_OPTIONS = frozenset(("convert", "keep_inline_images_in", "strip",))
+
+def option_key(options):
+    """ options as a sorted tuple of those that differ from DEFAULT_OPTIONS; unknown names are a TypeError """
+    items = []
+    for name, value in options.items():
+        if name not in DEFAULT_OPTIONS: raise TypeError(f"unexpected option {name!r}")
+        # normalized, so equal options give equal keys, and hashable for dispatch
+        if   name == "escape_chars":                        value = "".join(sorted(set(value)))
+        elif name == "bullets":                             value = value if isinstance(value, str) else tuple(value)
+        elif name in TAG_SET_OPTIONS and value is not None: value = tuple(sorted(set(value)))
+        if value != DEFAULT_OPTIONS[name]: items.append((name, value))
+    pass
+    return tuple(sorted(items))
+pass
+
+@lru_cache(maxsize = 128)
+def dispatch(key):
+    """
+    The converter table and text converter for an option_key, built once per set of options. Each option is
+    settled here, by picking or building the converters, so none is looked at while converting.
+    """
+    if not key: return FUNCTIONS, process_text
+    options = {**DEFAULT_OPTIONS, **dict(key)}
+    if options["strip"] is not None and options["convert"] is not None:
+        raise ValueError("You may specify either tags to strip or tags to convert, but not both.")
+    if (heading_style := options["heading_style"]) not in (ATX, ATX_CLOSED, UNDERLINED):
+        raise ValueError(f"heading_style must be ATX, ATX_CLOSED or UNDERLINED, not {heading_style!r}")
+    if (newline_style := options["newline_style"]) not in (SPACES, BACKSLASH):
+        raise ValueError(f"newline_style must be SPACES or BACKSLASH, not {newline_style!r}")
+
+    functions = dict(PADDED_TABLE_FUNCTIONS if options["pad_tables"] else FUNCTIONS)
+    symbol    = options["strong_em_symbol"]
+    strong    = inline_converter(symbol * 2, "convert_b")
+    em        = inline_converter(symbol,     "convert_em")
+    functions.update({
+        "a"      : link_converter(options["autolinks"], options["default_title"]),
+        "b"      : strong,
+        "strong" : strong,
+        "em"     : em,
+        "i"      : em,
+        "img"    : image_converter(options["keep_inline_images_in"]),
+        "li"     : list_item_converter(options["bullets"]),
+        "pre"    : pre_converter(options["code_language"], options["code_language_callback"]),
+        "sub"    : inline_converter(options["sub_symbol"], "convert_sub"),
+        "sup"    : inline_converter(options["sup_symbol"], "convert_sup"),
+    })
+    if heading_style != UNDERLINED:
+        functions.update({f"h{n}" : heading_converter(n, heading_style == ATX_CLOSED) for n in range(1, 7)})
+    if newline_style == BACKSLASH:
+        functions["br"] = lambda el, text, c, ctx: "" if c else "\\\n"
+    if options["wrap"]:
+        functions["p"]  = paragraph_converter(options["wrap_width"])
+    # a tag without a converter is replaced by its converted children
+    if options["strip"] is not None:
+        functions = {tag : f for tag, f in functions.items() if tag not in options["strip"]}
+    if options["convert"] is not None:
+        functions = {tag : f for tag, f in functions.items() if tag in options["convert"]}
+
+    escapes = options["escape_chars"] + "_" * bool(options["escape_underscores"]) + "*" * bool(options["escape_asterisks"])
+    return functions, text_converter(escapes)
+pass
+
+def convert_compiled(text, parse, key, functions, convert_text, stats = None, cache = None, engine = None,
+                     fragments = None, limits = None, encoding = None, sink = None):
+    """ convert, for options already compiled to their option_key and its dispatch table """
+    text      = html_input(text, encoding)
+    truncated = None
+    write     = None if sink is None else sink_writer(sink)
+    if limits is not None:
+        start = perf_counter()
+        if limits.max_bytes is not None and (prefix := utf8_prefix(text, limits.max_bytes)) is not None:
+            if not limits.truncate: raise LimitExceeded("max_bytes", limits.max_bytes)
+            text, truncated = prefix, "max_bytes"
+    pass
+    if cache is not None:
+        cache_key = cache.key(text, engine, *key)
+        if (markdown := cache.get(cache_key)) is None:
+            markdown = convert_compiled(text, parse, key, functions, convert_text, stats, fragments = fragments,
+                                        limits = limits)
+            # where a limit cuts a conversion short depends on the limits and the clock, so only whole ones are kept
+            if not isinstance(markdown, PartialMarkdown): cache.put(cache_key, markdown)
+        pass
+        if write is not None and markdown: write(markdown)
+    else:
+        if fragments is not None: fragments = fragments.scoped(key)
+        guard = None if limits is None else Guard(limits, start)
+        if stats is not None:
+            markdown = stats.convert(text, parse, fragments, functions, convert_text, guard, write)
+        elif (root := parse(cleanup_code(text))) is None:
+            markdown = ""
         else:
-            pre = PRE_TAG
+            markdown = process_tag(root, as_inline = False, children_only = True, functions = functions,
+                                   convert_text = convert_text, fragments = fragments, guard = guard, write = write)
         pass
+        if guard is not None and truncated is None: truncated = guard.truncated
+    pass
+    # with a sink, the Markdown is out, and what is left to tell is whether a limit cut it short
+    if sink is not None: return getattr(markdown, "truncated", truncated)
+    if truncated is None or isinstance(markdown, PartialMarkdown): return markdown
+    return PartialMarkdown(markdown, truncated)
+pass
 
-        text = f"{text[:code_start]}{pre}{code}{text[code_end:]}"
-        i = code_start + len(pre) + len(code) + len(PRE_END_TAG)
+def convert(text, parse, stats = None, cache = None, engine = None, fragments = None, limits = None, encoding = None,
+            sink = None, **options):
+    """
+    cleanup_code, parse, then walk the tree. text is a str, or HTML bytes (bytes, memoryview or mmap) in the
+    encoding sniff_encoding finds, with encoding (e.g. from a Content-Type header) as its hint.
+    With stats (a ConversionStats), each step is measured into it;
+    with cache (see markdownify.cache), engine's output for text is looked up first and stored after;
+    with fragments (a FragmentCache), the Markdown of large subtrees seen on earlier pages is reused;
+    with limits (a Limits), the conversion is bounded in input size, nodes, depth and time;
+    with sink (see sink_writer), the Markdown is written to it as it is converted instead of returned, and
+    what is returned is None, or the limit that truncated it.
+    options are those of DEFAULT_OPTIONS.
+    """
+    key = option_key(options)
+    return convert_compiled(text, select_parse(parse, options.get("select")), key, *dispatch(key), stats, cache,
+                            engine, fragments, limits, encoding, sink)
+pass
+
+def markdownify_lxml(text, stats = None, cache = None, fragments = None, limits = None, encoding = None, sink = None,
+                     **options):
+    """ Like markdownify_fast, but walks the lxml tree directly instead of building a BeautifulSoup """
+    return convert(text, parse_lxml, stats, cache, markdownify_lxml, fragments, limits, encoding, sink, **options)
+pass
+
+def markdownify_fast(text, stats = None, cache = None, fragments = None, limits = None, encoding = None, sink = None,
+                     **options):
+    return convert(text, parse_fast, stats, cache, markdownify_fast, fragments, limits, encoding, sink, **options)
+pass
+
+def markdownify(text, stats = None, cache = None, fragments = None, limits = None, encoding = None, sink = None,
+                **options):
+    return convert(text, parse_html, stats, cache, markdownify, fragments, limits, encoding, sink, **options)
+pass
+
+def convert_tree(tree, key, functions, convert_text, fragments = None, limits = None, sink = None):
+    # without lxml loaded, the tree cannot be lxml's
+    if (lxml := sys.modules.get("lxml.etree")) is not None:
+        if isinstance(tree, lxml._ElementTree): tree = tree.getroot()
+        if isinstance(tree, lxml._Element):     tree = EtreeTag(tree)
     pass
-    return text
+    if fragments is not None: fragments = fragments.scoped(key)
+    guard = None if limits is None else Guard(limits, perf_counter())
+    write = None if sink is None else sink_writer(sink)
+    if (select := dict(key).get("select")) is None:
+        markdown = process_tag(tree, as_inline = False, children_only = True, functions = functions,
+                               convert_text = convert_text, fragments = fragments, guard = guard, write = write)
+    else:
+        # the tree is the caller's, so the matches are converted where they are, one after the other
+        if isinstance(tree, EtreeTag): nodes = [EtreeTag(el) for el in etree_matches(tree.element, select)]
+        else:                          nodes = soup_matches(tree, select)
+        # side by side in a body, as the parsers put them, so converters looking at their parent or siblings
+        # (code, tr) see the same as with markdownify_lxml
+        body      = Context(tree, None, False, True, nodes)
+        body.name = "body"
+        parts     = []
+        for body.i, node in enumerate(nodes):
+            if guard is not None and guard.truncated is not None: break
+            parts.append(process_tag(node, as_inline = False, functions = functions, convert_text = convert_text,
+                                     fragments = fragments, guard = guard, write = write, parent = body))
+        pass
+        markdown = "".join(parts)
+    pass
+    if sink is not None:         return None if guard is None else guard.truncated
+    if guard is None or guard.truncated is None: return markdown
+    return PartialMarkdown(markdown, guard.truncated)
 pass
 
-def markdownify_fast(text):
-    text = cleanup_code(text)
-    soup = BeautifulSoup(text, "lxml", parser = HTMLParser)
-    return process_tag(soup, as_inline = False, children_only = True)
+def markdownify_tree(tree, fragments = None, limits = None, sink = None, **options):
+    """
+    Convert the children of an already parsed tree: a BeautifulSoup or Tag, or an lxml element or element tree.
+    The tree is only read, so it can be converted again or shared with other passes. cleanup_code works on the
+    HTML text, so it is not applied here, and neither is the max_bytes of limits. With select, the elements it
+    matches are converted in place. sink is as in convert.
+    """
+    key = option_key(options)
+    return convert_tree(tree, key, *dispatch(key), fragments, limits, sink)
 pass
 
-def markdownify(text):
-    text = cleanup_code(text)
-    soup = BeautifulSoup(text, "html.parser")
-    return process_tag(soup, as_inline = False, children_only = True)
+PARSE = {
+    "lxml"        : parse_lxml,    # as markdownify_lxml
+    "fast"        : parse_fast,    # as markdownify_fast
+    "html.parser" : parse_html,    # as markdownify
+}
+
+class MarkdownConverter:
+    """
+    A converter for one set of options (those of DEFAULT_OPTIONS), compiled once to its dispatch table, so a
+    conversion goes straight to the walk. engine picks the parser, as in markdownify.main: "html.parser",
+    "fast" or "lxml". A converter is immutable, so threads can share it, and it pickles as its engine and
+    options, so it can be sent to worker processes as the converter of markdownify_many.
+
+    A subclass can override convert_<tag>(self, el, text, as_inline, ctx) for any tag, or add one for a tag
+    that has none; super() reaches the converter the options chose.
+    """
+    __slots__ = ("engine", "limits", "options", "key", "functions", "convert_text", "parse", "base")
+
+    def __init__(self, engine = "html.parser", limits = None, **options):
+        if engine not in PARSE: raise ValueError(f"engine must be one of {', '.join(PARSE)}, not {engine!r}")
+        key = option_key(options)
+        base, convert_text = dispatch(key)
+        functions = base
+        cls = type(self)
+        if (overrides := {name[len("convert_"):] : getattr(self, name) for name in dir(cls)
+                          if name.startswith("convert_") and name != "convert_soup"
+                          and getattr(cls, name) is not getattr(MarkdownConverter, name, None)}):
+            functions = {**base, **overrides}
+            # keeps the subclass's results and fragments apart from those of other converters
+            key += (("converter", f"{cls.__module__}.{cls.__qualname__}"),)
+        pass
+        init = object.__setattr__
+        init(self, "engine",       engine)
+        init(self, "limits",       limits)
+        init(self, "options",      dict(option_key(options)))
+        init(self, "key",          key)
+        init(self, "functions",    functions)
+        init(self, "convert_text", convert_text)
+        init(self, "parse",        select_parse(PARSE[engine], self.options.get("select")))
+        init(self, "base",         base)
+    pass
+
+    def convert(self, html, stats = None, cache = None, fragments = None, limits = None, encoding = None, sink = None):
+        """
+        Convert html, a str or HTML bytes with encoding as a hint, or write it to sink as convert does;
+        limits replaces the converter's own
+        """
+        return convert_compiled(html, self.parse, self.key, self.functions, self.convert_text, stats, cache, self,
+                                fragments, self.limits if limits is None else limits, encoding, sink)
+    pass
+
+    def __call__(self, html, stats = None, cache = None, fragments = None, limits = None, encoding = None, sink = None):
+        return self.convert(html, stats, cache, fragments, limits, encoding, sink)
+    pass
+
+    def convert_soup(self, tree, fragments = None, limits = None, sink = None):
+        """ markdownify_tree with this converter """
+        return convert_tree(tree, self.key, self.functions, self.convert_text, fragments,
+                            self.limits if limits is None else limits, sink)
+    pass
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+    pass
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+    pass
+
+    def __reduce__(self):
+        return partial(type(self), self.engine, self.limits, **self.options), ()
+    pass
+
+    def __repr__(self):
+        limits  = "" if self.limits is None else f", limits={self.limits!r}"
+        options = "".join(f", {name}={value!r}" for name, value in self.options.items())
+        return f"{type(self).__module__}.{type(self).__qualname__}(engine={self.engine!r}{limits}{options})"
+    pass
 pass
+
+def base_converter(tag):
+    """ MarkdownConverter.convert_<tag>: the converter the options chose for tag """
+    def convert(self, el, text, as_inline, ctx):
+        # a stripped tag has none: it is replaced by its children, as in the walk
+        if (function := self.base.get(tag)) is None: return text
+        return function(el, text, as_inline, ctx)
+    pass
+    convert.__name__ = convert.__qualname__ = f"convert_{tag}"
+    return convert
+pass
+
+for tag in FUNCTIONS: setattr(MarkdownConverter, f"convert_{tag}", base_converter(tag))
+del tag
+
+# The rest of the API lives in modules that import what they need (asyncio, sqlite3, multiprocessing), so
+# each is only imported when one of its names is first used
+LAZY_NAMES = {
+    "ConversionStats"         : "stats",
+    "FragmentCache"           : "cache",
+    "MemoryCache"             : "cache",
+    "SqliteCache"             : "cache",
+    "PageState"               : "cache",
+    "markdownify_incremental" : "cache",
+    "markdownify_stream"      : "stream",
+    "markdownify_file"        : "stream",
+    "markdownify_many"        : "batch",
+    "imarkdownify_many"       : "batch",
+    "markdownify_parallel"    : "batch",
+    "AsyncConverter"          : "aio",
+    "amarkdownify"            : "aio",
+    "amarkdownify_many"       : "aio",
+    "amarkdownify_stream"     : "aio",
+}
+
+def __getattr__(name):
+    if (module := LAZY_NAMES.get(name)) is None: raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = globals()[name] = getattr(importlib.import_module(f".{module}", __name__), name)
+    return value
+pass
+
+def __dir__():
+    return sorted({*globals(), *LAZY_NAMES})
+pass
+
+# What import * gives: the public API, the lazy names included, and none of the modules and helpers above
+__all__ = [
+    "markdownify", "markdownify_fast", "markdownify_lxml", "markdownify_tree", "MarkdownConverter",
+    "DEFAULT_OPTIONS", "ATX", "ATX_CLOSED", "UNDERLINED", "SETEXT", "SPACES", "BACKSLASH", "ASTERISK", "UNDERSCORE",
+    "Limits", "LimitExceeded", "NestingTooDeep", "PartialMarkdown", "Context", "FUNCTIONS", "process_tag",
+    "process_text", "cleanup_code", "convert_a", "convert_b", "convert_blockquote", "convert_code", "convert_del", "convert_em",
+    "convert_h1", "convert_h2", "convert_img", "convert_li", "convert_list", "convert_pre", "convert_sub",
+    "convert_tr",
+] + list(LAZY_NAMES)
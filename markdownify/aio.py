@@ -0,0 +1,148 @@
+import asyncio
+import os
+import threading
+import weakref
+
+from . import markdownify_fast
+from .batch import BACKENDS
+from .stream import CHUNK_SIZE, markdownify_stream
+
+LARGE_BYTES = 1 << 20
+
+class AsyncConverter:
+    """
+    Runs conversions for asyncio code on a pool of threads or processes, so the event loop keeps serving I/O.
+
+    Documents of large_bytes or more go to a lane of their own with large_workers workers, so a burst of
+    huge pages cannot hold up the small ones. Each lane admits at most twice its workers at a time; further
+    callers wait, which is the backpressure. Cancelling a caller cancels its conversion if it has not
+    started; a conversion already running finishes in its worker and its result is dropped.
+    """
+    def __init__(self, workers = None, backend = "thread", converter = markdownify_fast,
+                 large_bytes = LARGE_BYTES, large_workers = None):
+        if backend not in BACKENDS: raise ValueError(f"backend must be one of {', '.join(BACKENDS)}, not {backend!r}")
+        self.workers       = workers or os.cpu_count() or 1
+        self.large_workers = large_workers or max(1, self.workers // 4)
+        self.converter     = converter
+        self.large_bytes   = large_bytes
+        self.executors     = (BACKENDS[backend](self.workers), BACKENDS[backend](self.large_workers))
+        self.semaphores    = weakref.WeakKeyDictionary()   # per event loop, as asyncio primitives belong to one
+    pass
+
+    def lane(self, text):
+        loop = asyncio.get_running_loop()
+        if (semaphores := self.semaphores.get(loop)) is None:
+            semaphores = self.semaphores[loop] = (asyncio.Semaphore(2 * self.workers),
+                                                  asyncio.Semaphore(2 * self.large_workers))
+        large = len(text) >= self.large_bytes
+        return self.executors[large], semaphores[large]
+    pass
+
+    async def convert(self, text, converter = None):
+        """ The Markdown of text, converted by converter (this object's by default) in a worker """
+        executor, semaphore = self.lane(text)
+        async with semaphore:
+            return await asyncio.get_running_loop().run_in_executor(executor, converter or self.converter, text)
+    pass
+
+    async def capture(self, i, text, converter):
+        try:
+            return i, await self.convert(text, converter)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return i, e
+    pass
+
+    async def map(self, docs, converter = None, limit = None):
+        """
+        Convert docs (an iterable or async iterable), yielding (index, markdown) pairs as they complete; a
+        document that fails yields its exception instead. At most limit documents (by default, as many as
+        both lanes admit) are read ahead of the results, so docs can be endless.
+        """
+        limit   = limit or 2 * (self.workers + self.large_workers)
+        pending = set()
+        try:
+            i = 0
+            async for text in aiterate(docs):
+                pending.add(asyncio.ensure_future(self.capture(i, text, converter)))
+                i += 1
+                if len(pending) >= limit:
+                    done, pending = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED)
+                    for task in done: yield task.result()
+            pass
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED)
+                for task in done: yield task.result()
+        finally:
+            # the consumer stopped early or was cancelled: drop whatever is still queued
+            for task in pending: task.cancel()
+        pass
+    pass
+
+    def close(self, wait = True):
+        for executor in self.executors: executor.shutdown(wait = wait)
+    pass
+
+    async def __aenter__(self):
+        return self
+    pass
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+    pass
+pass
+
+async def aiterate(items):
+    if hasattr(items, "__aiter__"):
+        async for item in items: yield item
+    else:
+        for item in items: yield item
+pass
+
+DEFAULT      = None
+DEFAULT_LOCK = threading.Lock()
+
+def default_converter():
+    global DEFAULT
+    with DEFAULT_LOCK:
+        if DEFAULT is None: DEFAULT = AsyncConverter()
+        return DEFAULT
+pass
+
+async def amarkdownify(text, converter = markdownify_fast, pool = None):
+    """ Convert text with converter on pool (an AsyncConverter; a shared thread pool by default) """
+    return await (pool or default_converter()).convert(text, converter)
+pass
+
+async def amarkdownify_many(docs, converter = markdownify_fast, pool = None, limit = None):
+    """ Like AsyncConverter.map on pool (a shared thread pool by default) """
+    async for pair in (pool or default_converter()).map(docs, converter, limit):
+        yield pair
+pass
+
+async def amarkdownify_stream(source, chunk_size = CHUNK_SIZE, **options):
+    """
+    markdownify_stream for asyncio: source is an async iterable of HTML chunks (or anything markdownify_stream
+    takes), and options are passed on to it. Parsing runs in a worker thread one block at a time, only as fast as the Markdown is consumed.
+    """
+    loop = asyncio.get_running_loop()
+    if hasattr(source, "__aiter__"):
+        chunks = source.__aiter__()
+
+        def pull():
+            # runs in the worker thread, fetching each chunk on the event loop
+            while True:
+                try:
+                    yield asyncio.run_coroutine_threadsafe(chunks.__anext__(), loop).result()
+                except StopAsyncIteration:
+                    return
+        pass
+        source = pull()
+    pass
+
+    blocks = markdownify_stream(source, chunk_size, **options)
+    done   = object()
+    while (text := await loop.run_in_executor(None, next, blocks, done)) is not done:
+        yield text
+pass
@@ -0,0 +1,217 @@
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial
+
+from . import (SKIP_NODES, TABLE_SECTIONS, Context, MarkdownConverter, PartialMarkdown, TableState, cleanup_code,
+               convert_table_padded, dispatch, html_input, markdownify, markdownify_fast, markdownify_lxml, option_key,
+               parse_fast, parse_html, parse_lxml, process_children, select_parse, tree_children)
+
+BACKENDS = {
+    "process" : ProcessPoolExecutor,
+    "thread"  : ThreadPoolExecutor,
+}
+
+def convert_batch(converter, batch):
+    """ Worker side: convert (index, html) pairs, keeping an exception in place of a failed document """
+    results = []
+    for i, html in batch:
+        try:
+            results.append((i, converter(html)))
+        except Exception as e:
+            results.append((i, e))
+    pass
+    return results
+pass
+
+def iter_batches(items, chunksize):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == chunksize:
+            yield batch
+            batch = []
+    pass
+    if batch: yield batch
+pass
+
+def cache_misses(items, cache, converter, keys, ready):
+    """ Pass on the (index, html) pairs not in cache, recording their keys; hits go to ready instead """
+    for i, html in items:
+        key = cache.key(html, converter)
+        if (markdown := cache.get(key)) is None:
+            keys[i] = key
+            yield i, html
+        else:
+            ready.append((i, markdown))
+    pass
+pass
+
+def imarkdownify_many(docs, workers = None, backend = "process", chunksize = 1, converter = markdownify_fast, cache = None):
+    """
+    Convert docs on a pool of workers, yielding (index, markdown) pairs as they complete. A document that
+    fails yields its exception instead of markdown, and the rest of the batch carries on.
+
+    Documents go out in batches of chunksize, each pickled once when it is submitted. At most two batches
+    per worker are in flight, so docs can be a lazy iterable of any length.
+
+    With a cache (see markdownify.cache), documents are looked up and stored in this process: hits are
+    yielded without reaching a worker, and workers never touch the cache.
+    """
+    if backend not in BACKENDS: raise ValueError(f"backend must be one of {', '.join(BACKENDS)}, not {backend!r}")
+    workers = workers or os.cpu_count() or 1
+    task    = partial(convert_batch, converter)
+    items   = enumerate(docs)
+    keys    = {}
+    ready   = []
+    if cache is not None: items = cache_misses(items, cache, converter, keys, ready)
+
+    def drain():
+        while ready: yield ready.pop()
+    pass
+
+    with BACKENDS[backend](workers) as executor:
+        pending = {}
+
+        def collect(futures):
+            for future in futures:
+                batch = pending.pop(future)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    # the worker itself died (or the results would not pickle): fail just this batch
+                    results = [(i, e) for i, _ in batch]
+                pass
+                for i, markdown in results:
+                    key = keys.pop(i, None)
+                    # as in convert_compiled, neither failures nor conversions cut short by a limit are kept
+                    if key is not None and not isinstance(markdown, (Exception, PartialMarkdown)):
+                        cache.put(key, markdown)
+                    yield i, markdown
+            pass
+        pass
+
+        for batch in iter_batches(items, chunksize):
+            yield from drain()
+            pending[executor.submit(task, batch)] = batch
+            if len(pending) >= 2 * workers:
+                done, _ = wait(pending, return_when = FIRST_COMPLETED)
+                yield from collect(done)
+        pass
+        yield from drain()
+        while pending:
+            done, _ = wait(pending, return_when = FIRST_COMPLETED)
+            yield from collect(done)
+    pass
+pass
+
+def markdownify_many(docs, workers = None, backend = "process", chunksize = 1, ordered = True, converter = markdownify_fast,
+                     cache = None):
+    """
+    Convert many documents in parallel with converter (markdownify_fast by default; for the process backend it
+    must be picklable, i.e. a module-level function). backend is "process" or "thread".
+
+    Returns a list in input order, holding the exception for any document that failed. With ordered=False,
+    returns an iterator of (index, markdown) pairs in completion order instead.
+    """
+    results = imarkdownify_many(docs, workers, backend, chunksize, converter, cache)
+    if not ordered: return results
+    by_index = dict(results)
+    return [by_index[i] for i in range(len(by_index))]
+pass
+
+ENGINES = {
+    markdownify_lxml : parse_lxml,
+    markdownify_fast : parse_fast,
+    markdownify      : parse_html,
+}
+
+# What markdownify_parallel's workers convert: set just before they fork, so each finds it in its copy
+SPLIT = None
+
+def convert_range(start, stop):
+    """ Worker side: convert the children from start up to but not including stop of the element split up """
+    ctx, children, functions, convert_text = SPLIT
+    ctx.i = start - 1
+    return process_children(ctx, stop, children, functions, convert_text)
+pass
+
+def splittable(ctx, functions):
+    """
+    Whether ctx's children convert the same in separate processes as in one pass: not the cells of a row,
+    which make the row together, nor the rows of a table that share rowspans or padded column widths
+    """
+    if (name := ctx.name) == "tr": return False
+    table = ctx if name == "table" else ctx.parent if name in TABLE_SECTIONS else None
+    if table is None or table.name != "table": return True
+    return functions.get("table") is not convert_table_padded and not TableState(table).has_spans
+pass
+
+def markdownify_parallel(html, workers = None, converter = markdownify_lxml, encoding = None, min_bytes = 1 << 20,
+                         **options):
+    """
+    Convert one large document on several processes. Below the root and any element that is the only one
+    in its parent (html, body, a wrapping <div>) are the page's top-level children: they go out to workers
+    in contiguous ranges, and their Markdown is joined in order. The workers are forked with the whole
+    parsed tree, so every converter still sees its real siblings and index (list numbering, header rows,
+    the whitespace next to a list), and the result is the same as converter(html).
+
+    converter is markdownify, markdownify_fast or markdownify_lxml, with options, or a MarkdownConverter.
+    A document under min_bytes, a converter with limits, and platforms without fork are converted serially.
+    """
+    if isinstance(converter, MarkdownConverter):
+        if options: raise TypeError("a MarkdownConverter has its options already")
+        parse, functions, convert_text = converter.parse, converter.functions, converter.convert_text
+        serial = converter.limits is not None
+    elif (parse := ENGINES.get(converter)) is not None:
+        key = option_key(options)
+        functions, convert_text = dispatch(key)
+        parse  = select_parse(parse, options.get("select"))
+        serial = False
+    else:
+        raise TypeError("converter must be markdownify, markdownify_fast, markdownify_lxml or a MarkdownConverter")
+    pass
+    workers = workers or os.cpu_count() or 1
+    text    = html_input(html, encoding)
+    if serial or workers < 2 or len(text) < min_bytes or "fork" not in multiprocessing.get_all_start_methods():
+        return converter(html, encoding = encoding, **options)
+    if (root := parse(cleanup_code(text))) is None: return ""
+
+    # down through the elements alone in their parents, converting what comes before each as the walk would
+    children = tree_children(root)
+    ctx      = Context(root, None, False, True, children(root))
+    path     = []
+    while True:
+        elements = [i for i, el in enumerate(ctx.kids) if el and type(el) not in SKIP_NODES and not isinstance(el, str)]
+        if len(elements) != 1 or ctx.kids[elements[0]].name == "tr": break
+        before = process_children(ctx, elements[0], children, functions, convert_text)
+        path.append((ctx, before))
+        ctx.i = i = elements[0]
+        ctx   = Context(ctx.kids[i], ctx, ctx.inline, False, children(ctx.kids[i]))
+    pass
+
+    n = len(ctx.kids)
+    if n < 2 or not splittable(ctx, functions):
+        text = process_children(ctx, n, children, functions, convert_text)
+    else:
+        # more ranges than workers, so those that finish first take the rest
+        step   = -(-n // (4 * workers))
+        starts = range(0, n, step)
+        global SPLIT
+        SPLIT = (ctx, children, functions, convert_text)
+        try:
+            with ProcessPoolExecutor(min(workers, len(starts)), multiprocessing.get_context("fork")) as executor:
+                text = "".join(executor.map(convert_range, starts, [min(start + step, n) for start in starts]))
+        finally:
+            SPLIT = None
+    pass
+
+    # and back up, converting what comes after each
+    while True:
+        if ctx.convert and (function := functions.get(ctx.name)):
+            text = function(ctx.node, text, ctx.as_inline, ctx)
+        if not path: return text
+        ctx, before = path.pop()
+        text = before + text + process_children(ctx, len(ctx.kids), children, functions, convert_text)
+    pass
+pass
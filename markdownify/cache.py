@@ -0,0 +1,436 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from hashlib import blake2b, sha256
+
+from . import EncodedHTML, EtreeTag, etree, html_input, markdownify_lxml
+
+# Part of every key: bump it whenever a change to the converters changes their output
+CACHE_VERSION = 1
+
+ADDRESS_RE = re.compile(r" at 0x[0-9a-fA-F]+>")
+
+def key_repr(value):
+    """ repr(value), for a key: a TypeError if it names a callable or object by its memory address """
+    name = repr(value)
+    if ADDRESS_RE.search(name):
+        raise TypeError(f"{name} cannot be cached: its memory address differs from process to process and is "
+                        f"reused once it is freed; use a module-level function, or give it a __repr__ naming "
+                        f"what it converts with")
+    pass
+    return name
+pass
+
+def converter_name(converter):
+    """
+    converter as it is keyed: the same in every process, so a SqliteCache is shared. A function by its
+    qualified name, a partial by its function and arguments, and any other callable by its repr, which must
+    name its configuration (as a MarkdownConverter's does). Lambdas and nested functions share their names
+    with other functions, so they are a TypeError, as is a callable among the options.
+    """
+    if isinstance(converter, partial):
+        return f"{converter_name(converter.func)}{key_repr(converter.args)}{key_repr(converter.keywords)}"
+    if hasattr(converter, "__qualname__"):
+        name = f"{converter.__module__}.{converter.__qualname__}"
+        if "<lambda>" in name or "<locals>" in name or getattr(converter, "__closure__", None):
+            raise TypeError(f"{name} cannot be cached: other functions have the same name; "
+                            f"use a module-level function")
+        pass
+        return name
+    pass
+    if not callable(converter):
+        return str(converter)
+    return key_repr(converter)
+pass
+
+class Cache:
+    """
+    Converted Markdown keyed by a hash of the converter, its options and the input HTML, so re-crawled,
+    mirrored or syndicated copies of a page are converted once. Counts hits and misses per process.
+    """
+    def __init__(self):
+        self.hits   = 0
+        self.misses = 0
+    pass
+
+    def key(self, text, converter, *options):
+        digest = sha256(f"{CACHE_VERSION}\0{converter_name(converter)}\0{key_repr(options)}\0".encode())
+        # HTML bytes as the conversion will read them: an EncodedHTML, or a str if they had to be decoded
+        if not isinstance(text, (str, EncodedHTML)): text = html_input(text)
+        if isinstance(text, str):
+            digest.update(text.encode("utf-8", "surrogatepass"))
+        else:
+            # an EncodedHTML: its bytes, read in its encoding
+            digest.update(f"{text.encoding}\0".encode())
+            digest.update(text.data)
+        pass
+        return digest.hexdigest()
+    pass
+
+    def get(self, key):
+        """ The Markdown stored under key, or None """
+        markdown = self.lookup(key)
+        if markdown is None: self.misses += 1
+        else:                self.hits   += 1
+        return markdown
+    pass
+pass
+
+def entry_size(key, markdown):
+    return len(key) + len(markdown.encode("utf-8", "surrogatepass"))
+pass
+
+class MemoryCache(Cache):
+    """ An in-process LRU cache holding at most max_bytes of keys and UTF-8 Markdown """
+    def __init__(self, max_bytes = 64 << 20):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.size      = 0
+        self.entries   = OrderedDict()
+        self.lock      = threading.Lock()
+    pass
+
+    def lookup(self, key):
+        with self.lock:
+            if (markdown := self.entries.get(key)) is not None: self.entries.move_to_end(key)
+            return markdown
+    pass
+
+    def put(self, key, markdown):
+        size = entry_size(key, markdown)
+        if size > self.max_bytes: return
+        with self.lock:
+            if (old := self.entries.pop(key, None)) is not None: self.size -= entry_size(key, old)
+            self.entries[key] = markdown
+            self.size += size
+            while self.size > self.max_bytes:
+                old_key, old = self.entries.popitem(last = False)
+                self.size -= entry_size(old_key, old)
+        pass
+    pass
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+    pass
+
+    def __len__(self):
+        return len(self.entries)
+    pass
+
+    def __getstate__(self):
+        # a copy sent to a worker process starts with the same entries and a lock of its own
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+    pass
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+    pass
+pass
+
+class SqliteCache(Cache):
+    """
+    A cache in an sqlite database at path, which any number of processes can share. With max_bytes, the
+    least recently used entries are evicted once the stored keys and Markdown exceed it.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS markdown (key TEXT PRIMARY KEY, value TEXT NOT NULL,
+                                             size INTEGER NOT NULL, used INTEGER NOT NULL);
+        CREATE INDEX IF NOT EXISTS markdown_used ON markdown (used);
+        CREATE TABLE IF NOT EXISTS total (id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER NOT NULL);
+        INSERT OR IGNORE INTO total VALUES (0, 0);
+        CREATE TRIGGER IF NOT EXISTS markdown_insert AFTER INSERT ON markdown
+            BEGIN UPDATE total SET size = size + new.size; END;
+        CREATE TRIGGER IF NOT EXISTS markdown_delete AFTER DELETE ON markdown
+            BEGIN UPDATE total SET size = size - old.size; END;
+    """
+    EVICT_TO = 0.9
+
+    def __init__(self, path, max_bytes = None, timeout = 30.0):
+        super().__init__()
+        self.path      = os.fspath(path)
+        self.max_bytes = max_bytes
+        self.timeout   = timeout
+        self.local     = threading.local()
+        self.connection().executescript(self.SCHEMA)
+    pass
+
+    def connection(self):
+        # one connection per thread, and a new one in a forked child rather than the parent's
+        local = self.local
+        if getattr(local, "pid", None) != os.getpid():
+            local.db  = sqlite3.connect(self.path, timeout = self.timeout, isolation_level = None)
+            local.db.execute("PRAGMA journal_mode = WAL")
+            local.db.execute("PRAGMA synchronous = NORMAL")
+            local.pid = os.getpid()
+        return local.db
+    pass
+
+    def lookup(self, key):
+        db  = self.connection()
+        row = db.execute("SELECT value FROM markdown WHERE key = ?", (key,)).fetchone()
+        if row is None: return None
+        db.execute("UPDATE markdown SET used = ? WHERE key = ?", (time.time_ns(), key))
+        return row[0]
+    pass
+
+    def put(self, key, markdown):
+        size = entry_size(key, markdown)
+        if self.max_bytes is not None and size > self.max_bytes: return
+        db = self.connection()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            # DELETE then INSERT rather than REPLACE, so the triggers keep the total right
+            db.execute("DELETE FROM markdown WHERE key = ?", (key,))
+            db.execute("INSERT INTO markdown VALUES (?, ?, ?, ?)", (key, markdown, size, time.time_ns()))
+            if self.max_bytes is not None and (total := db.execute("SELECT size FROM total").fetchone()[0]) > self.max_bytes:
+                # evict the least recently used down to EVICT_TO of max_bytes, so eviction runs now and then
+                db.execute("""DELETE FROM markdown WHERE key IN (SELECT key FROM (
+                                  SELECT key, size, SUM(size) OVER (ORDER BY used, key) AS running FROM markdown)
+                              WHERE running - size < ?)""", (total - int(self.max_bytes * self.EVICT_TO),))
+            pass
+        pass
+    pass
+
+    @property
+    def size(self):
+        return self.connection().execute("SELECT size FROM total").fetchone()[0]
+    pass
+
+    def clear(self):
+        self.connection().execute("DELETE FROM markdown")
+    pass
+
+    def __len__(self):
+        return self.connection().execute("SELECT COUNT(*) FROM markdown").fetchone()[0]
+    pass
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["local"]
+        return state
+    pass
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.local = threading.local()
+    pass
+pass
+
+class FragmentCache(MemoryCache):
+    """
+    Markdown of large subtrees, reused across pages that share them (headers, navigation, sidebars, footers).
+    Pass it as fragments = ... to the markdownify functions; keep one per site, since that is what repeats.
+
+    An element's key is a hash of its markup and of what the walk hands down to it (inline or block, list
+    depth, inside a list item, its parent's name), so a reused fragment is exactly what converting it again
+    would give. Only elements at most max_depth levels down with at least min_bytes of markup are looked up,
+    which bounds the serializing, and elements whose conversion looks at their siblings (li, tr, lists,
+    table sections) are never cached. lxml serializes a subtree in C; a BeautifulSoup tree is hashed
+    bottom up instead, each tag once per conversion, as serializing it in Python at every level would cost
+    more than converting it.
+    """
+    UNCACHEABLE = frozenset(("li", "tr", "ul", "ol", "list", "thead", "tbody", "tfoot"))
+
+    def __init__(self, max_bytes = 16 << 20, min_bytes = 1024, max_depth = 6):
+        super().__init__(max_bytes)
+        self.min_bytes = min_bytes
+        self.max_depth = max_depth
+    pass
+
+    def scoped(self, options):
+        """
+        A view of this cache for one conversion with options, whose fragments never mix with other options'
+        """
+        return ScopedFragments(self, key_repr(options).encode() if options else b"")
+    pass
+
+    def fragment_key(self, node, ctx, scope = b"", digests = None):
+        """
+        The key for node, about to be converted below ctx, or None if it is not worth caching; digests holds
+        the soup tags hashed so far in this conversion
+        """
+        return fragment_key(node, ctx, scope, self.min_bytes, self.max_depth, digests)
+    pass
+pass
+
+def keyable(node, ctx, max_depth):
+    """ Whether node, about to be converted below ctx, is no more than max_depth levels down and converts alone """
+    if node.name in FragmentCache.UNCACHEABLE: return False
+    parent = ctx
+    for _ in range(max_depth):
+        if (parent := parent.parent) is None: return True
+    pass
+    return False
+pass
+
+def context_key(digest, state, ctx, scope):
+    """ Finish digest, a hash of a node's markup, with what the walk hands down to it """
+    digest.update(f"\0{state} {ctx.name} {ctx.inline} {ctx.ul_depth} {ctx.in_li} {ctx.raw}\0".encode())
+    digest.update(scope)
+    return digest.digest()
+pass
+
+def fragment_key(node, ctx, scope, min_bytes, max_depth, digests = None):
+    """
+    A hash of node's markup and of what the walk hands down to it, or None for a node smaller than min_bytes,
+    more than max_depth levels down, or one whose conversion looks at its siblings. A soup tag is hashed with
+    soup_digest, into digests.
+    """
+    if not keyable(node, ctx, max_depth): return None
+    if isinstance(node, EtreeTag):
+        markup = etree.tostring(node.element, with_tail = False)
+        if len(markup) < min_bytes: return None
+        return context_key(blake2b(markup, digest_size = 16), f"etree {node.preserve}", ctx, scope)
+    pass
+    if digests is None: digests = {}
+    digest, size = digests.get(id(node)) or soup_digest(node, digests)
+    if size < min_bytes: return None
+    return context_key(blake2b(digest, digest_size = 16), "soup", ctx, scope)
+pass
+
+def soup_digest(node, digests):
+    """
+    (hash of node's markup, about how many bytes it is), made bottom up and iteratively, so nesting depth is
+    unbounded; each tag hashed is put in digests by id, so no tag of a tree is hashed twice while it is alive
+    """
+    def start(tag):
+        digest = blake2b(f"{tag.name}\0{tag.attrs!r}\0".encode(), digest_size = 16)
+        return [tag, iter(tag.contents), digest, 2 * len(tag.name) + 5]
+    pass
+    stack = [start(node)]
+    while True:
+        tag, children, digest, _ = top = stack[-1]
+        for child in children:
+            if child.name is not None:
+                if (known := digests.get(id(child))) is None:
+                    stack.append(start(child))
+                    break
+                pass
+                digest.update(known[0])
+                top[3] += known[1]
+            else:
+                digest.update(f"\0{type(child).__name__}\0{child}".encode("utf-8", "surrogatepass"))
+                top[3] += len(child)
+            pass
+        else:
+            digests[id(tag)] = known = (digest.digest(), top[3])
+            stack.pop()
+            if not stack: return known
+            stack[-1][2].update(known[0])
+            stack[-1][3] += known[1]
+        pass
+    pass
+pass
+
+class ScopedFragments:
+    """
+    A FragmentCache seen through a scope by one conversion: shared entries and counters, keys of their own,
+    and the hashes of the soup tags of the tree being converted, which only live as long as it
+    """
+    __slots__ = ("cache", "scope", "digests")
+
+    def __init__(self, cache, scope):
+        self.cache   = cache
+        self.scope   = scope
+        self.digests = {}   # id(soup tag) -> soup_digest
+    pass
+
+    def fragment_key(self, node, ctx):
+        return self.cache.fragment_key(node, ctx, self.scope, self.digests)
+    pass
+
+    def get(self, key):
+        return self.cache.get(key)
+    pass
+
+    def put(self, key, markdown):
+        self.cache.put(key, markdown)
+    pass
+pass
+
+class PageState(Cache):
+    """
+    What converting one page leaves for converting its next version: the Markdown of its subtrees, keyed as
+    in a FragmentCache, each with the keys of those inside it. markdownify_incremental makes one per
+    conversion from the one before, which it only reads; the new one holds the subtrees of the new page
+    alone, so it never grows past one page. It pickles, to be kept with the page.
+
+    Every subtree is hashed for its key, as a FragmentCache does.
+    """
+    def __init__(self, previous = None, min_bytes = 256, max_depth = 6):
+        super().__init__()
+        self.min_bytes = min_bytes
+        self.max_depth = max_depth
+        self.entries   = {}   # key -> (markdown, keys of the entries inside it)
+        self.previous  = {} if previous is None else previous.entries
+        self.open      = [[]]   # for each subtree being converted, the keys of those found inside it so far
+    pass
+
+    def scoped(self, options):
+        return FragmentCache.scoped(self, options)
+    pass
+
+    def fragment_key(self, node, ctx, scope = b"", digests = None):
+        return fragment_key(node, ctx, scope, self.min_bytes, self.max_depth, digests)
+    pass
+
+    def lookup(self, key):
+        if (entry := self.entries.get(key)) is not None:
+            # a copy of a subtree met earlier on this page
+            self.open[-1].append(key)
+            return entry[0]
+        pass
+        if (entry := self.previous.get(key)) is None:
+            # the walk converts the subtree, and puts it when it is done
+            self.open.append([])
+            return None
+        pass
+        # the subtrees inside this one are kept too, for when it changes next time
+        stack = [key]
+        while stack:
+            inner = stack.pop()
+            self.entries[inner] = self.previous[inner]
+            stack += self.previous[inner][1]
+        pass
+        self.open[-1].append(key)
+        return entry[0]
+    pass
+
+    def put(self, key, markdown):
+        self.entries[key] = (markdown, tuple(self.open.pop()))
+        self.open[-1].append(key)
+    pass
+
+    def __len__(self):
+        return len(self.entries)
+    pass
+
+    def __getstate__(self):
+        # the previous conversion's entries were only there to be read
+        return {**self.__dict__, "previous" : {}, "open" : [[]]}
+    pass
+pass
+
+def markdownify_incremental(text, state = None, converter = markdownify_lxml, **kwargs):
+    """
+    Convert text, a new version of a page whose previous conversion left state (a PageState, or None the first
+    time), and return (markdown, the state to pass next time). Only the subtrees that changed are converted
+    again; the Markdown of the others is taken from state, so the result is the same as converting text
+    afresh. converter is one of the markdownify functions or a MarkdownConverter, and kwargs go to it,
+    except cache: a cached result would skip the walk that fills the new state.
+    """
+    if "cache" in kwargs: raise TypeError("markdownify_incremental takes no cache; state is what it reuses")
+    new = PageState(state) if state is None else PageState(state, state.min_bytes, state.max_depth)
+    markdown = converter(text, fragments = new, **kwargs)
+    new.previous, new.open = {}, [[]]
+    return markdown, new
+pass
@@ -1,10 +1,119 @@
 #!/usr/bin/env python
 
 import argparse
+import glob
+import hashlib
+import json
+import os
 import sys
+import time
 
-from markdownify import markdownify, ATX, ATX_CLOSED, UNDERLINED, \
-    SPACES, BACKSLASH, ASTERISK, UNDERSCORE
+from markdownify import (ATX, ATX_CLOSED, ASTERISK, BACKSLASH, DEFAULT_OPTIONS, PARSE, SPACES, UNDERLINED, UNDERSCORE,
+                         Limits, MarkdownConverter, PartialMarkdown)
+
+ENGINES = tuple(PARSE)
+HTML_SUFFIXES = ('.html', '.htm', '.xhtml')
+MANIFEST = '.markdownify-manifest.json'
+
+
+def find_inputs(patterns):
+    """Yield (path, relative output path) for every HTML file named by the
+    files, globs and directories in patterns."""
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, dirs, files in os.walk(pattern):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(HTML_SUFFIXES):
+                        path = os.path.join(root, name)
+                        yield path, os.path.relpath(path, pattern)
+        elif not glob.has_magic(pattern):
+            # named explicitly, so a missing file is reported rather than skipped
+            yield pattern, os.path.basename(pattern)
+        else:
+            # mirror below the part of the pattern that has no wildcards
+            base = os.path.dirname(pattern.split('*')[0].split('?')[0].split('[')[0])
+            for path in sorted(glob.glob(pattern, recursive=True)):
+                if os.path.isfile(path):
+                    yield path, os.path.relpath(path, base) if base else path
+
+
+def output_path(output_dir, rel):
+    return os.path.join(output_dir, os.path.splitext(rel)[0] + '.md')
+
+
+def convert_file(task):
+    """Worker side: convert one file unless its content hash is unchanged.
+    Returns (rel, hash, converted, size), with no hash for a truncated output."""
+    converter, path, dest, rel, known_hash = task
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    if digest == known_hash and os.path.exists(dest):
+        return rel, digest, False, len(data)
+    # bytes, so a BOM or <meta charset> decides the encoding
+    text = converter(data)
+    os.makedirs(os.path.dirname(dest) or '.', exist_ok=True)
+    with open(dest, 'w', encoding='utf-8') as f:
+        f.write(text)
+    # a truncated output is not the input's markdown, so it is converted again next time
+    return rel, None if isinstance(text, PartialMarkdown) else digest, True, len(data)
+
+
+def load_manifest(path, converter):
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # a different engine or different options may give different output, so their hashes do not count
+    return manifest.get('files', {}) if manifest.get('converter') == repr(converter) else {}
+
+
+def save_manifest(path, converter, files):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'converter': repr(converter), 'files': files}, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def convert_tree(args, converter):
+    # imported here, so converting STDIN does not start with importing multiprocessing
+    from markdownify import imarkdownify_many
+
+    manifest_path = args.manifest or os.path.join(args.output_dir, MANIFEST)
+    known = {} if args.force else load_manifest(manifest_path, converter)
+    inputs = list(dict(find_inputs(args.inputs)).items())
+    tasks = [(converter, path, output_path(args.output_dir, rel), rel, known.get(rel))
+             for path, rel in inputs]
+
+    start = time.perf_counter()
+    # only the inputs of this run, so those that are gone drop out of the manifest
+    files = {}
+    converted = skipped = size = 0
+    errors = []
+    for i, result in imarkdownify_many(tasks, workers=args.jobs, chunksize=args.chunksize,
+                                       converter=convert_file):
+        if isinstance(result, Exception):
+            errors.append((inputs[i][0], result))
+            continue
+        rel, digest, changed, nbytes = result
+        if digest is not None:
+            files[rel] = digest
+        size += nbytes
+        converted += changed
+        skipped += not changed
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    save_manifest(manifest_path, converter, files)
+
+    for path, error in errors:
+        print('error: %s: %s: %s' % (path, type(error).__name__, error), file=sys.stderr)
+    print('%d converted, %d unchanged, %d failed; %.1f MB in %.2fs (%.1f MB/s)' % (
+        converted, skipped, len(errors), size / 1e6, elapsed, size / 1e6 / elapsed if elapsed else 0),
+        file=sys.stderr)
+    return 1 if errors else 0
 
 
 def main(argv=sys.argv[1:]):
@@ -13,49 +122,66 @@ def main(argv=sys.argv[1:]):
         description='Converts html to markdown.',
     )
 
-    parser.add_argument('html', nargs='?', type=argparse.FileType('r'),
-                        default=sys.stdin,
-                        help="The html file to convert. Defaults to STDIN if not "
-                        "provided.")
+    parser.add_argument('inputs', nargs='*',
+                        help="HTML files, globs or directories to convert. Reads STDIN "
+                        "and writes STDOUT if none are given.")
+    parser.add_argument('-o', '--output-dir',
+                        help="Write one .md file per input here, mirroring the input tree. "
+                        "Without it, the markdown of all inputs goes to STDOUT.")
+    parser.add_argument('-e', '--engine', default='lxml', choices=ENGINES,
+                        help="The conversion engine to use.")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="Number of worker processes. Defaults to the number of CPUs.")
+    parser.add_argument('--chunksize', type=int, default=8,
+                        help="Number of files handed to a worker at a time.")
+    parser.add_argument('--manifest',
+                        help="Where to keep the content hashes used to skip unchanged "
+                        "inputs. Defaults to %s in the output directory." % MANIFEST)
+    parser.add_argument('-f', '--force', action='store_true',
+                        help="Convert every input, even if it is unchanged since the last run.")
+
     parser.add_argument('-s', '--strip', nargs='*',
                         help="A list of tags to strip. This option can't be used with "
                         "the --convert option.")
     parser.add_argument('-c', '--convert', nargs='*',
                         help="A list of tags to convert. This option can't be used with "
                         "the --strip option.")
-    parser.add_argument('-a', '--autolinks', action='store_true',
-                        help="A boolean indicating whether the 'automatic link' style "
-                        "should be used when a 'a' tag's contents match its href.")
-    parser.add_argument('--default-title', action='store_false',
-                        help="A boolean to enable setting the title of a link to its "
-                        "href, if no title is given.")
-    parser.add_argument('--heading-style', default=UNDERLINED,
+    parser.add_argument('-a', '--no-autolinks', dest='autolinks', action='store_false',
+                        help="Do not use the 'automatic link' style when an 'a' tag's "
+                        "contents match its href.")
+    parser.add_argument('--default-title', action='store_true',
+                        help="Set the title of a link to its href, if no title is given.")
+    parser.add_argument('--heading-style', default=UNDERLINED, type=str.lower,
                         choices=(ATX, ATX_CLOSED, UNDERLINED),
                         help="Defines how headings should be converted.")
-    parser.add_argument('-b', '--bullets', default='*+-',
+    parser.add_argument('-b', '--bullets', default=DEFAULT_OPTIONS['bullets'],
                         help="A string of bullet styles to use; the bullet will "
                         "alternate based on nesting level.")
     parser.add_argument('--strong-em-symbol', default=ASTERISK,
                         choices=(ASTERISK, UNDERSCORE),
-                        help="Use * or _ to convert strong and italics text"),
+                        help="Use * or _ to convert strong and italics text.")
     parser.add_argument('--sub-symbol', default='',
                         help="Define the chars that surround '<sub>'.")
     parser.add_argument('--sup-symbol', default='',
                         help="Define the chars that surround '<sup>'.")
-    parser.add_argument('--newline-style', default=SPACES,
+    parser.add_argument('--newline-style', default=SPACES, type=str.lower,
                         choices=(SPACES, BACKSLASH),
                         help="Defines the style of <br> conversions: two spaces "
-                        "or backslash at the and of the line thet should break.")
+                        "or backslash at the end of the line thats broken.")
     parser.add_argument('--code-language', default='',
                         help="Defines the language that should be assumed for all "
-                        "'<pre>' sections.")
+                        "'<pre>' sections that name none.")
     parser.add_argument('--no-escape-asterisks', dest='escape_asterisks',
                         action='store_false',
                         help="Do not escape '*' to '\\*' in text.")
     parser.add_argument('--no-escape-underscores', dest='escape_underscores',
                         action='store_false',
                         help="Do not escape '_' to '\\_' in text.")
-    parser.add_argument('-i', '--keep-inline-images-in', nargs='*',
+    parser.add_argument('--escape-chars', default='',
+                        help="Further characters to escape with a backslash in text.")
+    parser.add_argument('--pad-tables', action='store_true',
+                        help="Pad table columns to a common width.")
+    parser.add_argument('-i', '--keep-inline-images-in', default=[], nargs='*',
                         help="Images are converted to their alt-text when the images are "
                         "located inside headlines or table cells. If some inline images "
                         "should be converted to markdown images instead, this option can "
@@ -63,11 +189,44 @@ def main(argv=sys.argv[1:]):
                         "contain inline images.")
     parser.add_argument('-w', '--wrap', action='store_true',
                         help="Wrap all text paragraphs at --wrap-width characters.")
-    parser.add_argument('--wrap-width', type=int, default=80)
+    parser.add_argument('--wrap-width', type=int, default=80,
+                        help="The width to wrap paragraphs at with --wrap.")
+    parser.add_argument('--select',
+                        help="Only convert the elements this XPath (starting with '/' or '(') "
+                        "or CSS selector matches, such as //article or main. CSS selectors "
+                        "need the cssselect package with the lxml engines.")
+
+    parser.add_argument('--max-bytes', type=int,
+                        help="Fail any input larger than this many bytes.")
+    parser.add_argument('--max-nodes', type=int,
+                        help="Fail any input with more elements and text nodes than this.")
+    parser.add_argument('--max-depth', type=int,
+                        help="Fail any input with elements nested deeper than this.")
+    parser.add_argument('--timeout', type=float,
+                        help="Fail any input that takes longer than this many seconds.")
+    parser.add_argument('--truncate', action='store_true',
+                        help="Instead of failing an input that hits one of the limits above, "
+                        "write what was converted until then.")
 
     args = parser.parse_args(argv)
-    print(markdownify(**vars(args)))
+    options = {name: getattr(args, name) for name in DEFAULT_OPTIONS if hasattr(args, name)}
+    limits = None
+    if any(value is not None for value in (args.max_bytes, args.max_nodes, args.max_depth, args.timeout)):
+        limits = Limits(args.max_bytes, args.max_nodes, args.max_depth, args.timeout, args.truncate)
+    try:
+        convert = MarkdownConverter(args.engine, limits, **options)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.output_dir:
+        return convert_tree(args, convert)
+    if not args.inputs:
+        sys.stdout.write(convert(sys.stdin.buffer.read()))
+        return 0
+    for path, _ in find_inputs(args.inputs):
+        with open(path, 'rb') as f:
+            sys.stdout.write(convert(f.read()))
+    return 0
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
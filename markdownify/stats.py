@@ -0,0 +1,99 @@
+from time import perf_counter
+
+from . import FUNCTIONS, SKIP_NODES, Context, Sink, cleanup_code, process_text, tree_children, walk
+
+class ConversionStats:
+    """
+    Measurements of one or more conversions, filled in by passing stats = ConversionStats() to markdownify,
+    markdownify_fast or markdownify_lxml. Conversions without it run the plain code, so this costs nothing off.
+
+    calls, seconds: per converter (its function name, or the tag name for the FUNCTIONS lambdas), with
+                    "process_text" for text nodes. A converter's time excludes its children.
+    phases:         seconds spent in cleanup_code, parse and traverse.
+    nodes:          elements and text nodes in the parsed tree; max_depth, the deepest element nesting.
+    """
+    def __init__(self):
+        self.calls       = {}
+        self.seconds     = {}
+        self.phases      = {"cleanup_code" : 0.0, "parse" : 0.0, "traverse" : 0.0}
+        self.nodes       = 0
+        self.max_depth   = 0
+        self.conversions = 0
+    pass
+
+    def timed(self, key, function):
+        calls, seconds = self.calls, self.seconds
+        def timed_function(*args):
+            start = perf_counter()
+            try:
+                return function(*args)
+            finally:
+                seconds[key] = seconds.get(key, 0.0) + perf_counter() - start
+                calls[key]   = calls.get(key, 0) + 1
+        pass
+        return timed_function
+    pass
+
+    def instrument(self, functions):
+        """ A copy of the dispatch table functions with every converter timed into this object """
+        return {tag : self.timed(tag if function.__name__ == "<lambda>" else function.__name__, function)
+                for tag, function in functions.items()}
+    pass
+
+    def count(self, root, children):
+        """ Count the nodes below root and their depth, without converting anything """
+        stack = [(root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if depth > self.max_depth: self.max_depth = depth
+            for el in children(node):
+                if not el or type(el) in SKIP_NODES: continue
+                self.nodes += 1
+                if not isinstance(el, str): stack.append((el, depth + 1))
+        pass
+    pass
+
+    def convert(self, text, parse, fragments = None, functions = FUNCTIONS, convert_text = process_text, guard = None,
+                write = None):
+        phases = self.phases
+        start  = perf_counter()
+        text   = cleanup_code(text)
+        parsed = perf_counter()
+        root   = parse(text)
+        phases["cleanup_code"] += parsed - start
+        phases["parse"]        += perf_counter() - parsed
+        self.conversions       += 1
+        if root is None: return ""
+
+        children = tree_children(root)
+        self.count(root, children)
+        start = perf_counter()
+        ctx   = Context(root, None, False, True, children(root))
+        if write is not None: ctx.parts = Sink(write)
+        text  = walk(ctx, children, self.instrument(functions), self.timed("process_text", convert_text), fragments,
+                     guard)
+        phases["traverse"] += perf_counter() - start
+        return text
+    pass
+
+    def merge(self, other):
+        """ Add other's measurements to this one's, e.g. to aggregate sampled conversions """
+        for key, n in other.calls.items():     self.calls[key]   = self.calls.get(key, 0) + n
+        for key, t in other.seconds.items():   self.seconds[key] = self.seconds.get(key, 0.0) + t
+        for key, t in other.phases.items():    self.phases[key] += t
+        self.nodes       += other.nodes
+        self.max_depth    = max(self.max_depth, other.max_depth)
+        self.conversions += other.conversions
+        return self
+    pass
+
+    def as_dict(self):
+        return {"calls" : dict(self.calls), "seconds" : dict(self.seconds), "phases" : dict(self.phases),
+                "nodes" : self.nodes, "max_depth" : self.max_depth, "conversions" : self.conversions}
+    pass
+
+    def __repr__(self):
+        return (f"ConversionStats(conversions={self.conversions}, nodes={self.nodes}, max_depth={self.max_depth}, "
+                f"phases={ {key : round(t, 6) for key, t in self.phases.items()} })")
+    pass
+pass
@@ -0,0 +1,146 @@
+import codecs
+import mmap
+import os
+from itertools import chain
+from lxml import etree
+
+from . import (Context, EtreeTag, NestingTooDeep, ascii_compatible, dispatch, etree_children, iter_cleanup_code,
+               lxml_encoding, option_key, process_children, process_tag, sink_writer, sniff_encoding, stopped_nesting)
+
+CHUNK_SIZE = 1 << 16
+
+def read_file(source, chunk_size):
+    while (chunk := source.read(chunk_size)): yield chunk
+pass
+
+def read_chunks(source, chunk_size = CHUNK_SIZE):
+    """
+    Chunks from a file object (text or binary, or an mmap), of a str or bytes-like source, or the source itself
+    if it is already an iterable of chunks
+    """
+    if hasattr(source, "read"):                     return read_file(source, chunk_size)
+    if isinstance(source, (str, bytes, bytearray)): return (source,)
+    if isinstance(source, memoryview):
+        view = source.cast("B")
+        return (bytes(view[i : i + chunk_size]) for i in range(0, len(view), chunk_size))
+    return source
+pass
+
+def sniffed_chunks(chunks, hint = None):
+    """
+    chunks, and the encoding to parse them in: str chunks as they are, with None. Bytes chunks are sniffed
+    as sniff_encoding does it from the first, and are decoded on the way when lxml could not read them.
+    """
+    chunks = iter(chunks)
+    if (first := next(chunks, None)) is None or isinstance(first, str): return chain((first or "",), chunks), None
+    # the <meta> charset may be anywhere in the first 1024 bytes, so that much is read before deciding
+    while len(first) < 1024 and (chunk := next(chunks, None)) is not None: first = bytes(first) + chunk
+    encoding, bom = sniff_encoding(first, hint)
+    chunks = chain((bytes(first[bom:]),), chunks)
+    if ascii_compatible(encoding) and lxml_encoding(encoding) is not None: return chunks, encoding
+    decoder = codecs.getincrementaldecoder(encoding)("replace")
+    return chain((decoder.decode(chunk) for chunk in chunks), (decoder.decode(b"", True),)), None
+pass
+
+def etree_context(element, parent = None):
+    """ A Context for an lxml element, as the walk would have built it below parent """
+    node = EtreeTag(element)
+    if parent is None: return Context(node, None, False, True, etree_children(node))
+    return Context(node, parent, parent.inline, False, etree_children(node))
+pass
+
+def child_index(ctx, element):
+    for i, el in enumerate(ctx.kids):
+        if isinstance(el, EtreeTag) and el.element is element: return i
+    return len(ctx.kids)
+pass
+
+def markdownify_stream(source, chunk_size = CHUNK_SIZE, encoding = None, **options):
+    """
+    Convert HTML arriving in chunks (an iterable of str or bytes, or a file object) and yield the Markdown of
+    each top-level block of <body> as soon as the block is complete. Converted blocks are dropped from the
+    tree, so memory follows the largest block rather than the document. Joined, the pieces equal
+    markdownify_lxml of the whole document with the same options, bytes being read as it reads them, with
+    encoding as the hint. options are those of DEFAULT_OPTIONS, except select. HTML nesting deeper than
+    libxml2 can parse (2048 levels) raises NestingTooDeep, as the blocks before it are already out.
+    """
+    if options.get("select") is not None: raise ValueError("markdownify_stream converts whole documents, without select")
+    functions, convert_text = dispatch(option_key(options))
+    chunks, encoding = sniffed_chunks(read_chunks(source, chunk_size), encoding)
+    parser = etree.HTMLPullParser(events = ("start",), tag = "body", recover = True, remove_pis = True, huge_tree = True,
+                                  encoding = encoding and lxml_encoding(encoding))
+    html = body = kept = None
+
+    def flush(final):
+        # Convert the body's children after the last block emitted (kept) up to the block still open,
+        # then drop all but the newest converted block, which stays as its successor's previous sibling
+        nonlocal kept
+        ctx  = etree_context(body, html)
+        kids = ctx.kids
+        if kept is not None: ctx.i = 1 if kept.tail else 0
+        stop = len(kids) if final else len(kids) - 1 - bool(body[-1].tail)
+        text = process_children(ctx, stop, etree_children, functions, convert_text)
+        if not final:
+            del body[:len(body) - 2]
+            body.text = None
+            kept = body[0]
+            kept.clear(keep_tail = True)
+        pass
+        return text
+    pass
+
+    for chunk in iter_cleanup_code(chunks, encoding):
+        parser.feed(chunk)
+        # the blocks before are out already, so this can only stop the stream
+        if stopped_nesting(parser): raise NestingTooDeep("the HTML nests deeper than libxml2 can parse")
+        for _, body in parser.read_events():
+            # Whatever precedes <body> (the <head>) is complete once it opens
+            html = etree_context(body.getparent())
+            at   = child_index(html, body)
+            if (text := process_children(html, at, etree_children, functions, convert_text)): yield text
+            html.i = at
+        pass
+        if body is not None and len(body) - (kept is not None) > 1:
+            if (text := flush(False)): yield text
+    pass
+
+    try:
+        root = parser.close()
+    except etree.XMLSyntaxError:
+        # nothing was fed, or nothing but whitespace
+        return
+    pass
+    if root is None: return
+    if body is None:
+        if (text := process_tag(EtreeTag(root), as_inline = False, children_only = True, functions = functions,
+                                convert_text = convert_text)):
+            yield text
+        return
+    pass
+    if (text := flush(True)): yield text
+    # and anything after </body>
+    html = etree_context(root)
+    html.i = child_index(html, body)
+    if (text := process_children(html, len(html.kids), etree_children, functions, convert_text)): yield text
+pass
+
+def markdownify_file(in_path, out, encoding = None, chunk_size = CHUNK_SIZE, **options):
+    """
+    Convert the HTML file at in_path and write its Markdown to out, block by block as markdownify_stream
+    converts them. out is a path, written as UTF-8, or any sink the conversion functions take (a text file
+    object, a list or a callable). The input is memory-mapped, so neither it nor the Markdown is ever held
+    whole, and peak memory follows the largest block rather than the file. encoding is the hint for the
+    input's encoding, and options are as in markdownify_stream.
+    """
+    if isinstance(out, (str, os.PathLike)):
+        with open(out, "w", encoding = "utf-8") as f: return markdownify_file(in_path, f, encoding, chunk_size, **options)
+    write = sink_writer(out)
+    with open(in_path, "rb") as f:
+        # an empty file cannot be mapped, and there is nothing to map in it
+        if os.fstat(f.fileno()).st_size == 0: return
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as data:
+            if hasattr(data, "madvise"): data.madvise(mmap.MADV_SEQUENTIAL)
+            for block in markdownify_stream(data, chunk_size, encoding, **options): write(block)
+        pass
+    pass
+pass
@@ -1,4 +1,9 @@
-from markdownify import markdownify as md
+from bs4 import BeautifulSoup
+from lxml import html as lxml_html
+
+from markdownify import markdownify as md, markdownify_fast, markdownify_tree
+
+from .test_tables import table_head_body
 
 
 def test_chomp():
@@ -37,3 +42,21 @@ def test_code_with_tricky_content():
 def test_special_tags():
     assert md('<!DOCTYPE html>') == ''
     assert md('<![CDATA[foobar]]>') == 'foobar'
+
+
+def test_deep_nesting():
+    assert md('<div>' * 5000 + 'deep_text' + '</div>' * 5000) == r'deep\_text'
+    assert md('<blockquote>' * 3 + 'q' + '</blockquote>' * 3) == '\n> > > q\n'
+
+
+def test_wide_nodes():
+    assert md('<p>' + '<b>a</b> ' * 5000 + '</p>') == '**a** ' * 5000 + '\n'
+
+
+def test_tree_is_not_modified():
+    html = '<ul>\n  <li>a</li>\n  <li>b\n    <ol> <li>c</li> </ol>\n  </li>\n</ul>' + table_head_body
+    soup = BeautifulSoup(html, 'lxml')
+    before = str(soup)
+    assert markdownify_tree(soup) == markdownify_tree(soup) == markdownify_fast(html)
+    assert str(soup) == before
+    assert markdownify_tree(lxml_html.document_fromstring(html)) == markdownify_fast(html)
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+from markdownify import AsyncConverter, amarkdownify, amarkdownify_many, amarkdownify_stream, markdownify_fast
+
+from .test_batch import docs, expected
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def collect(pairs):
+    return [pair async for pair in pairs]
+
+
+def test_amarkdownify():
+    assert run(amarkdownify('<b>x</b>')) == '**x**'
+
+
+def test_amarkdownify_many():
+    results = run(collect(amarkdownify_many(docs, limit=5)))
+    assert sorted(results) == sorted(enumerate(expected))
+
+
+def test_amarkdownify_many_async_source_and_errors():
+    async def source():
+        for html in docs[:5] + [None]:
+            await asyncio.sleep(0)
+            yield html
+    results = dict(run(collect(amarkdownify_many(source()))))
+    assert [results[i] for i in range(5)] == expected[:5]
+    assert isinstance(results[5], TypeError)
+
+
+def test_process_pool():
+    async def convert():
+        async with AsyncConverter(workers=2, backend='process') as pool:
+            return await collect(pool.map(docs))
+    assert sorted(run(convert())) == sorted(enumerate(expected))
+
+
+def test_large_documents_do_not_block_small_ones():
+    release = threading.Event()
+
+    def slow_on_large(html):
+        if len(html) > 100:
+            release.wait(5)
+        return markdownify_fast(html)
+
+    async def convert():
+        async with AsyncConverter(workers=2, large_workers=1, large_bytes=100, converter=slow_on_large) as pool:
+            large = [asyncio.ensure_future(pool.convert('<p>%s</p>' % ('x' * 200))) for _ in range(3)]
+            small = await asyncio.wait_for(asyncio.gather(*(pool.convert(html) for html in docs)), 5)
+            assert not any(task.done() for task in large)
+            release.set()
+            return small, await asyncio.gather(*large)
+    small, large = run(convert())
+    assert small == expected
+    assert large == ['x' * 200 + '\n'] * 3
+
+
+def test_cancellation():
+    release = threading.Event()
+
+    def blocked(html):
+        release.wait(5)
+        return html
+
+    async def convert():
+        async with AsyncConverter(workers=1, converter=blocked) as pool:
+            tasks = [asyncio.ensure_future(pool.convert(str(i))) for i in range(4)]
+            await asyncio.sleep(0.05)
+            for task in tasks[1:]:
+                task.cancel()
+            release.set()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            return results, await pool.convert('again')
+    results, again = run(convert())
+    assert results[0] == '0'
+    assert all(isinstance(r, asyncio.CancelledError) for r in results[1:])
+    assert again == 'again'
+
+
+def test_amarkdownify_stream():
+    async def chunks():
+        for chunk in ('<html><body><p>a', '</p><p>b</p>', '<ul><li>x</li></ul></body></html>'):
+            await asyncio.sleep(0)
+            yield chunk
+    assert run(collect(amarkdownify_stream(chunks()))) == ['a\n', 'b\n', '* x\n']
+    assert ''.join(run(collect(amarkdownify_stream('<p>one</p><p>two</p>')))) == 'one\ntwo\n'
@@ -2,32 +2,41 @@
 Test whitelisting/blacklisting of specific tags.
 
 """
+import pytest
+
 from markdownify import markdownify as md
 
 
-# def test_strip():
-#     text = md('<a href="https://github.com/matthewwithanm">Some Text</a>', strip=['a'])
-#     assert text == 'Some Text'
+def test_strip():
+    text = md('<a href="https://github.com/matthewwithanm">Some Text</a>', strip=['a'])
+    assert text == 'Some Text'
+
 
+def test_do_not_strip():
+    text = md('<a href="https://github.com/matthewwithanm">Some Text</a>', strip=[])
+    assert text == '[Some Text](https://github.com/matthewwithanm)'
 
-# def test_do_not_strip():
-#     text = md('<a href="https://github.com/matthewwithanm">Some Text</a>', strip=[])
-#     assert text == '[Some Text](https://github.com/matthewwithanm)'
 
 def test_do_not_strip2():
     text = md('<a href="https://github.com/matthewwithanm">Some Text</a>')
     assert text == '[Some Text](https://github.com/matthewwithanm)'
 
 
-# def test_convert():
-#     text = md('<a href="https://github.com/matthewwithanm">Some Text</a>', convert=['a'])
-#     assert text == '[Some Text](https://github.com/matthewwithanm)'
+def test_convert():
+    text = md('<a href="https://github.com/matthewwithanm">Some Text</a>', convert=['a'])
+    assert text == '[Some Text](https://github.com/matthewwithanm)'
+
 
 def test_convert2():
     text = md('<a href="https://github.com/matthewwithanm">Some Text</a>')
     assert text == '[Some Text](https://github.com/matthewwithanm)'
 
 
-# def test_do_not_convert():
-#     text = md('<a href="https://github.com/matthewwithanm">Some Text</a>', convert=[])
-#     assert text == 'Some Text'
+def test_do_not_convert():
+    text = md('<a href="https://github.com/matthewwithanm">Some Text</a>', convert=[])
+    assert text == 'Some Text'
+
+
+def test_strip_and_convert():
+    with pytest.raises(ValueError):
+        md('<a href="https://github.com/matthewwithanm">Some Text</a>', strip=['a'], convert=['b'])
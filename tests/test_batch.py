@@ -0,0 +1,77 @@
+import pytest
+
+from markdownify import (ATX, MarkdownConverter, imarkdownify_many, markdownify, markdownify_fast, markdownify_lxml,
+                         markdownify_many, markdownify_parallel)
+
+
+docs = ['<b>%d</b>' % i for i in range(50)]
+expected = ['**%d**' % i for i in range(50)]
+
+
+def picky(html):
+    if '13' in html:
+        raise ValueError('unlucky')
+    return markdownify_fast(html)
+
+
+def test_many_threads():
+    assert markdownify_many(docs, workers=4, backend='thread') == expected
+    assert markdownify_many(iter(docs), workers=3, backend='thread', chunksize=7) == expected
+
+
+def test_many_processes():
+    assert markdownify_many(docs, workers=2, chunksize=5) == expected
+    assert markdownify_many(docs, workers=2, converter=markdownify_lxml) == expected
+
+
+def test_many_captures_errors():
+    for backend in ('thread', 'process'):
+        results = markdownify_many(docs, workers=2, backend=backend, chunksize=4, converter=picky)
+        assert isinstance(results[13], ValueError)
+        assert results[:13] + results[14:] == expected[:13] + expected[14:]
+
+
+def test_many_unordered():
+    results = markdownify_many(docs, workers=4, backend='thread', ordered=False)
+    assert sorted(results, key=lambda pair: pair[0]) == list(enumerate(expected))
+    assert dict(imarkdownify_many([], backend='thread')) == {}
+
+
+def test_many_bad_backend():
+    try:
+        markdownify_many(docs, backend='gpu')
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+# top-level children whose conversion looks at their neighbours, many enough to end up in different ranges
+rows = '<tr><th>h</th></tr>' + '<tr><td>%d</td><td>x</td></tr>' * 20 % tuple(range(20))
+blocks = ''.join('<p>p %d</p>\n<ol start="%d"><li>a</li><li>b</li></ol>text %d<ul><li>c</li></ul>' % (i, i, i)
+                 for i in range(20))
+pages = ['<html><body>%s</body></html>' % blocks, '<div><main> %s </main></div>' % blocks,
+         '<ol>%s</ol>' % ('<li>item</li>' * 40), '<table>%s</table>' % rows, '<table><tbody>%s</tbody></table>' % rows,
+         '<table>%s<tr><td rowspan="2">span</td></tr>%s</table>' % (rows, rows)]
+
+
+def test_parallel():
+    for converter in (markdownify, markdownify_fast, markdownify_lxml):
+        for page in pages:
+            assert markdownify_parallel(page, workers=2, converter=converter, min_bytes=0) == converter(page)
+    for page in pages[-3:]:
+        assert markdownify_parallel(page, workers=3, min_bytes=0, pad_tables=True) == markdownify_lxml(page, pad_tables=True)
+    converter = MarkdownConverter('fast', heading_style=ATX)
+    assert markdownify_parallel(pages[0], workers=2, converter=converter, min_bytes=0) == converter(pages[0])
+
+
+def test_parallel_serial():
+    # small pages, a single worker or no top-level children to split convert as they would anyway
+    assert markdownify_parallel(pages[0], workers=2) == markdownify_lxml(pages[0])
+    assert markdownify_parallel(pages[0], workers=1, min_bytes=0) == markdownify_lxml(pages[0])
+    assert markdownify_parallel('<p>one</p>', workers=2, min_bytes=0) == 'one\n'
+    assert markdownify_parallel(b'', workers=2, min_bytes=0) == ''
+    with pytest.raises(TypeError):
+        markdownify_parallel(pages[0], converter=MarkdownConverter(), bullets='-')
+    with pytest.raises(TypeError):
+        markdownify_parallel(pages[0], converter=len)
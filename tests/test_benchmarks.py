@@ -0,0 +1,16 @@
+from benchmarks.corpus import CORPUS, generate
+from benchmarks.run import ENGINES, bench
+
+
+def test_corpus_is_reproducible():
+    assert generate(0.01) == generate(0.01)
+    assert set(generate(0.01)) == set(CORPUS)
+
+
+def test_bench_smoke():
+    # bench itself checks the phased pipeline gives the engine's own output
+    for name, html in generate(0.01).items():
+        for engine in ENGINES:
+            result = bench(name, html, engine, repeat=1)
+            assert result['bytes'] == len(html.encode('utf-8'))
+            assert result['peak_bytes'] > 0
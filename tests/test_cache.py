@@ -0,0 +1,193 @@
+import pickle
+import random
+from functools import partial
+
+import pytest
+from bs4 import BeautifulSoup
+
+from markdownify import (ATX, FragmentCache, MarkdownConverter, MemoryCache, SqliteCache, markdownify,
+                         markdownify_fast, markdownify_incremental, markdownify_lxml, markdownify_many, markdownify_tree)
+
+from .test_batch import docs, expected
+
+
+def test_memory_cache():
+    cache = MemoryCache()
+    assert markdownify_fast('<b>x</b>', cache=cache) == '**x**'
+    assert markdownify_fast('<b>x</b>', cache=cache) == '**x**'
+    assert (cache.hits, cache.misses) == (1, 1)
+    # another engine, another key
+    assert markdownify_lxml('<b>x</b>', cache=cache) == '**x**'
+    assert (cache.hits, cache.misses, len(cache)) == (1, 2, 2)
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_bytes=300)
+    for i in range(10):
+        markdownify_fast('<b>%d</b>' % i, cache=cache)
+        markdownify_fast('<b>0</b>', cache=cache)
+    assert cache.size <= 300
+    assert len(cache) < 10
+    assert cache.get(cache.key('<b>0</b>', markdownify_fast)) == '**0**'
+    assert cache.get(cache.key('<b>1</b>', markdownify_fast)) is None
+
+
+def test_sqlite_cache(tmp_path):
+    path = tmp_path / 'cache.db'
+    markdownify_fast('<i>y</i>', cache=SqliteCache(path))
+    # shared through the file
+    cache = SqliteCache(path, max_bytes=1000)
+    assert markdownify_fast('<i>y</i>', cache=cache) == '*y*'
+    assert (cache.hits, cache.misses) == (1, 0)
+    for i in range(50):
+        markdownify_fast('<b>%d</b>' % i, cache=cache)
+    assert 0 < cache.size <= 1000
+    assert len(cache) < 50
+
+
+def test_many_cached(tmp_path):
+    for cache in (MemoryCache(), SqliteCache(tmp_path / 'cache.db')):
+        assert markdownify_many(docs[:20], workers=2, cache=cache) == expected[:20]
+        assert markdownify_many(docs, workers=2, chunksize=3, cache=cache) == expected
+        assert markdownify_many(docs, workers=2, backend='thread', cache=cache) == expected
+        assert (cache.hits, cache.misses) == (70, 50)
+
+
+nav = '<nav><p>%s</p><ol><li>one</li><li>two</li></ol></nav>' % ('menu_item ' * 20)
+
+
+def test_fragment_cache():
+    fragments = FragmentCache(min_bytes=100)
+    misses = []
+    for i in range(3):
+        page = '<div>%s<p>page %d</p><blockquote>%s</blockquote></div>' % (nav, i, nav)
+        assert markdownify_lxml(page, fragments=fragments) == markdownify_lxml(page)
+        misses.append(fragments.misses)
+    # later pages only convert the body and div that differ, and reuse the nav and the blockquote
+    assert misses[2] - misses[1] == misses[1] - misses[0] == 2
+    assert fragments.hits >= 4
+
+
+def test_fragment_cache_soup():
+    fragments = FragmentCache(min_bytes=100)
+    for i in range(3):
+        page = '<div>%s<p>page %d</p><blockquote>%s</blockquote></div>' % (nav, i, nav)
+        assert markdownify_fast(page, fragments=fragments) == markdownify_fast(page)
+    assert fragments.hits >= 4
+    # a soup's tags are hashed afresh by each conversion, so a changed tree is not taken for the one before
+    soup = BeautifulSoup('<div>%s</div>' % nav, 'lxml')
+    assert markdownify_tree(soup, fragments=fragments) == markdownify_tree(soup)
+    soup.find('p').string = 'changed'
+    assert markdownify_tree(soup, fragments=fragments) == markdownify_tree(soup)
+    assert 'changed' in markdownify_tree(soup)
+
+
+def test_fragment_cache_context():
+    fragments = FragmentCache(min_bytes=10)
+    pre = '<pre><code>%s</code></pre>' % ('x  y ' * 10)
+    div = '<div><code>%s</code></div>' % ('x  y ' * 10)
+    assert markdownify_fast(pre, fragments=fragments) == markdownify_fast(pre)
+    assert markdownify_fast(div, fragments=fragments) == markdownify_fast(div)
+    assert markdownify_fast('<ol start="3"><li>%s</li></ol>' % nav, fragments=fragments).startswith('3. ')
+
+
+def test_fragment_cache_thresholds():
+    fragments = FragmentCache(min_bytes=10000)
+    markdownify_lxml(nav, fragments=fragments)
+    assert len(fragments) == 0
+    # only <body>, the one element directly below the root
+    fragments = FragmentCache(min_bytes=10, max_depth=1)
+    markdownify_lxml('<div><div><div>%s</div></div></div>' % nav, fragments=fragments)
+    assert len(fragments) == 1
+
+
+def block(i, version):
+    return ('<section><h2>Part %d</h2><p>version %d, %s</p><ul><li>%s</li><li>b</li></ul>'
+            '<pre><code>x  = %d\n   y</code></pre><blockquote>%s</blockquote></section>'
+            % (i, version, 'words ' * 30, 'item ' * 10, version, nav))
+
+
+def article(versions):
+    return '<body>%s<main>%s</main></body>' % (nav, ''.join(block(i, v) for i, v in enumerate(versions)))
+
+
+def test_incremental():
+    rng = random.Random(0)
+    for converter in (markdownify_lxml, markdownify_fast, markdownify, MarkdownConverter('lxml', heading_style=ATX)):
+        versions, state = [0] * 20, None
+        for _ in range(6):
+            for _ in range(rng.randrange(4)):
+                versions[rng.randrange(20)] += 1
+            page = article(versions)
+            markdown, state = markdownify_incremental(page, state, converter=converter)
+            assert markdown == converter(page)
+            state = pickle.loads(pickle.dumps(state))
+
+
+def test_incremental_reuses_unchanged_blocks():
+    versions = [0] * 20
+    _, state = markdownify_incremental(article(versions))
+    first = state.misses
+    versions[5] += 1
+    markdown, state = markdownify_incremental(article(versions), state)
+    assert markdown == markdownify_lxml(article(versions))
+    # body, main and the changed section are converted; the 19 other sections and the blockquote of the
+    # changed one are reused
+    assert state.misses == 3 < first
+    assert state.hits == 20
+    # what was reused is kept for the next version, so another change only misses where it is
+    versions[12] += 1
+    _, state = markdownify_incremental(article(versions), state)
+    assert (state.misses, state.hits) == (3, 20)
+
+
+def test_incremental_options():
+    _, state = markdownify_incremental(article([0] * 3))
+    markdown, _ = markdownify_incremental(article([0] * 3), state, heading_style=ATX)
+    assert markdown == markdownify_lxml(article([0] * 3), heading_style=ATX)
+    with pytest.raises(TypeError):
+        markdownify_incremental(article([0]), cache=MemoryCache())
+
+
+def test_many_cached_bytes():
+    cache = MemoryCache()
+    pages = [b'<p>a</p>', '<p>a</p>'.encode('utf-16'), b'<b>x</b>']
+    assert markdownify_many(pages, workers=2, backend='thread', cache=cache) == ['a\n', 'a\n', '**x**']
+    assert markdownify_many(pages, workers=2, backend='thread', cache=cache) == ['a\n', 'a\n', '**x**']
+    assert cache.hits == 3
+    # the same key as converting the bytes directly
+    assert markdownify_fast(b'<b>x</b>', cache=cache) == '**x**' and cache.hits == 4
+
+
+class Plain:
+    def __call__(self, html):
+        return markdownify_fast(html)
+
+
+def test_converter_keys():
+    cache = MemoryCache()
+    # keyed by what they convert with, not where they are in memory, so a shared cache hits from any process
+    assert cache.key('<b>x</b>', partial(markdownify_fast, bullets='-')) == \
+        cache.key('<b>x</b>', partial(markdownify_fast, bullets='-')) != \
+        cache.key('<b>x</b>', partial(markdownify_fast, bullets='+'))
+    assert cache.key('<b>x</b>', MarkdownConverter('lxml')) == cache.key('<b>x</b>', MarkdownConverter('lxml'))
+    with pytest.raises(TypeError):
+        cache.key('<b>x</b>', Plain())
+
+
+def bulleted(bullets):
+    return lambda html: markdownify_fast(html, bullets=bullets)
+
+
+def test_converters_without_keys():
+    cache = MemoryCache()
+    # lambdas and closures from one factory share a name, so none of them is cached
+    for converter in (bulleted('-'), bulleted('+'), lambda html: markdownify_fast(html)):
+        with pytest.raises(TypeError):
+            cache.key('<ul><li>x</li></ul>', converter)
+    # nor is a callback among the options, which would only be known by its memory address
+    with pytest.raises(TypeError):
+        markdownify_fast('<pre>x</pre>', code_language_callback=lambda el: 'py', cache=cache)
+    with pytest.raises(TypeError):
+        cache.key('<pre>x</pre>', MarkdownConverter(code_language_callback=bulleted))
+    assert len(cache) == 0
@@ -0,0 +1,122 @@
+import json
+import os
+
+from markdownify.main import main, MANIFEST
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_stdout(tmp_path, capsys):
+    write(str(tmp_path / 'a.html'), '<b>Hello</b>')
+    assert main([str(tmp_path / 'a.html')]) == 0
+    assert capsys.readouterr().out == '**Hello**'
+
+
+def test_directory_tree(tmp_path, capsys):
+    src, out = str(tmp_path / 'src'), str(tmp_path / 'out')
+    write(os.path.join(src, 'a.html'), '<h1>A</h1>')
+    write(os.path.join(src, 'sub', 'b.htm'), '<i>B</i>')
+    write(os.path.join(src, 'notes.txt'), 'not html')
+
+    assert main([src, '-o', out, '-j', '2']) == 0
+    assert read(os.path.join(out, 'a.md')) == 'A\n=\n'
+    assert read(os.path.join(out, 'sub', 'b.md')) == '*B*'
+    assert not os.path.exists(os.path.join(out, 'notes.md'))
+    assert '2 converted, 0 unchanged, 0 failed' in capsys.readouterr().err
+
+    manifest = json.loads(read(os.path.join(out, MANIFEST)))
+    assert sorted(manifest['files']) == ['a.html', os.path.join('sub', 'b.htm')]
+
+
+def test_skips_unchanged(tmp_path, capsys):
+    src, out = str(tmp_path / 'src'), str(tmp_path / 'out')
+    write(os.path.join(src, 'a.html'), '<b>a</b>')
+    write(os.path.join(src, 'b.html'), '<b>b</b>')
+    assert main([src, '-o', out, '-j', '1']) == 0
+    capsys.readouterr()
+
+    write(os.path.join(src, 'b.html'), '<b>changed</b>')
+    assert main([src, '-o', out, '-j', '1']) == 0
+    assert '1 converted, 1 unchanged, 0 failed' in capsys.readouterr().err
+    assert read(os.path.join(out, 'b.md')) == '**changed**'
+
+    assert main([src, '-o', out, '-j', '1', '--force']) == 0
+    assert '2 converted, 0 unchanged' in capsys.readouterr().err
+
+    os.remove(os.path.join(src, 'a.html'))
+    assert main([src, '-o', out, '-j', '1']) == 0
+    assert list(json.loads(read(os.path.join(out, MANIFEST)))['files']) == ['b.html']
+
+
+def test_glob(tmp_path, capsys):
+    write(str(tmp_path / 'x' / 'one.html'), '<b>1</b>')
+    write(str(tmp_path / 'x' / 'deep' / 'two.html'), '<b>2</b>')
+    out = str(tmp_path / 'out')
+    assert main([str(tmp_path / 'x' / '**' / '*.html'), '-o', out, '-j', '1']) == 0
+    assert read(os.path.join(out, 'one.md')) == '**1**'
+    assert read(os.path.join(out, 'deep', 'two.md')) == '**2**'
+
+
+def test_missing_file_fails(tmp_path, capsys):
+    assert main([str(tmp_path / 'missing.html'), '-o', str(tmp_path / 'out'), '-j', '1']) == 1
+    assert '0 converted, 0 unchanged, 1 failed' in capsys.readouterr().err
+
+
+def test_options(tmp_path, capsys):
+    src, out = str(tmp_path / 'src'), str(tmp_path / 'out')
+    write(os.path.join(src, 'a.html'), '<h1>A</h1><ul><li>b</li></ul>')
+    assert main([os.path.join(src, 'a.html'), '--heading-style', 'ATX', '-b', '-']) == 0
+    assert capsys.readouterr().out == '# A\n- b\n'
+
+    assert main([src, '-o', out, '-j', '1']) == 0
+    assert main([src, '-o', out, '-j', '1', '--heading-style', 'atx_closed']) == 0
+    # other options give other output, so nothing counts as unchanged
+    assert '1 converted, 0 unchanged, 0 failed' in capsys.readouterr().err.splitlines()[-1]
+    assert read(os.path.join(out, 'a.md')) == '# A #\n* b\n'
+
+
+def test_select(tmp_path, capsys):
+    path = str(tmp_path / 'a.html')
+    write(path, '<nav>menu</nav><article><p>text</p></article>')
+    assert main([path, '--select', '//article']) == 0
+    assert capsys.readouterr().out == 'text\n'
+    assert main([path, '-e', 'html.parser', '--select', 'nav']) == 0
+    assert capsys.readouterr().out == 'menu'
+
+
+def test_encoding(tmp_path, capsys):
+    src, out = str(tmp_path / 'src'), str(tmp_path / 'out')
+    os.makedirs(src)
+    with open(os.path.join(src, 'a.html'), 'wb') as f:
+        f.write('<meta charset="windows-1252"><p>café</p>'.encode('cp1252'))
+    assert main([os.path.join(src, 'a.html')]) == 0
+    assert capsys.readouterr().out == 'café\n'
+    assert main([src, '-o', out, '-j', '1']) == 0
+    with open(os.path.join(out, 'a.md'), encoding='utf-8') as f:
+        assert f.read() == 'café\n'
+
+
+def test_limits(tmp_path, capsys):
+    src, out = str(tmp_path / 'src'), str(tmp_path / 'out')
+    write(os.path.join(src, 'big.html'), '<ul>' + '<li>a</li>' * 100 + '</ul>')
+    write(os.path.join(src, 'small.html'), '<b>b</b>')
+    assert main([src, '-o', out, '-j', '1', '--max-nodes', '50']) == 1
+    assert 'big.html: LimitExceeded: conversion stopped at max_nodes=50' in capsys.readouterr().err
+    assert not os.path.exists(os.path.join(out, 'big.md'))
+    assert read(os.path.join(out, 'small.md')) == '**b**'
+
+    assert main([src, '-o', out, '-j', '1', '--max-nodes', '50', '--truncate']) == 0
+    assert read(os.path.join(out, 'big.md')).count('* a') < 50
+    capsys.readouterr()
+    # the truncated output is not kept as unchanged
+    assert main([src, '-o', out, '-j', '1', '--max-nodes', '50', '--truncate']) == 0
+    assert '1 converted, 1 unchanged' in capsys.readouterr().err
@@ -1,4 +1,4 @@
-from markdownify import markdownify as md
+from markdownify import markdownify as md, markdownify_lxml, ATX, ATX_CLOSED, BACKSLASH, UNDERSCORE
 
 
 def inline_tests(tag, markup):
@@ -14,7 +14,8 @@ def test_a():
     assert md('<a href="https://google.com">Google</a>') == '[Google](https://google.com)'
     assert md('<a href="https://google.com">https://google.com</a>') == '<https://google.com>'
     assert md('<a href="https://community.kde.org/Get_Involved">https://community.kde.org/Get_Involved</a>') == '<https://community.kde.org/Get_Involved>'
-    # assert md('<a href="https://community.kde.org/Get_Involved">https://community.kde.org/Get_Involved</a>', autolinks=False) == '[https://community.kde.org/Get\\_Involved](https://community.kde.org/Get_Involved)'
+    assert md('<a href="https://example.com/*a*/[b]">https://example.com/*a*/[b]</a>', escape_chars='[]') == '<https://example.com/*a*/[b]>'
+    assert md('<a href="https://community.kde.org/Get_Involved">https://community.kde.org/Get_Involved</a>', autolinks=False) == '[https://community.kde.org/Get\\_Involved](https://community.kde.org/Get_Involved)'
 
 
 def test_a_spaces():
@@ -27,7 +28,7 @@ def test_a_spaces():
 def test_a_with_title():
     text = md('<a href="http://google.com" title="The &quot;Goog&quot;">Google</a>')
     assert text == r'[Google](http://google.com "The \"Goog\"")'
-    # assert md('<a href="https://google.com">https://google.com</a>', default_title=True) == '[https://google.com](https://google.com "https://google.com")'
+    assert md('<a href="https://google.com">https://google.com</a>', default_title=True) == '[https://google.com](https://google.com "https://google.com")'
 
 
 def test_a_shortcut():
@@ -35,8 +36,8 @@ def test_a_shortcut():
     assert text == '<http://google.com>'
 
 
-# def test_a_no_autolinks():
-#     assert md('<a href="https://google.com">https://google.com</a>', autolinks=False) == '[https://google.com](https://google.com)'
+def test_a_no_autolinks():
+    assert md('<a href="https://google.com">https://google.com</a>', autolinks=False) == '[https://google.com](https://google.com)'
 
 
 def test_b():
@@ -74,7 +75,7 @@ def test_blockquote_nested():
 
 def test_br():
     assert md('a<br />b<br />c') == 'a  \nb  \nc'
-    # assert md('a<br />b<br />c', newline_style=BACKSLASH) == 'a\\\nb\\\nc'
+    assert md('a<br />b<br />c', newline_style=BACKSLASH) == 'a\\\nb\\\nc'
 
 
 def test_code():
@@ -118,14 +119,14 @@ def test_hn():
     assert md('<h6>Hello</h6>') == '###### Hello\n'
 
 
-# def test_hn_chained():
-#     assert md('<h1>First</h1>\n<h2>Second</h2>\n<h3>Third</h3>', heading_style=ATX) == '# First\n\n\n## Second\n\n\n### Third\n\n'
-#     assert md('X<h1>First</h1>', heading_style=ATX) == 'X# First\n\n'
+def test_hn_chained():
+    assert md('<h1>First</h1>\n<h2>Second</h2>\n<h3>Third</h3>', heading_style=ATX) == '# First\n\n## Second\n\n### Third\n'
+    assert md('X<h1>First</h1>', heading_style=ATX) == 'X# First\n'
 
 
-# def test_hn_nested_tag_heading_style():
-#     assert md('<h1>A <p>P</p> C </h1>', heading_style=ATX_CLOSED) == '# A P C #\n\n'
-#     assert md('<h1>A <p>P</p> C </h1>', heading_style=ATX) == '# A P C\n\n'
+def test_hn_nested_tag_heading_style():
+    assert md('<h1>A <p>P</p> C </h1>', heading_style=ATX_CLOSED) == '# A P C #\n'
+    assert md('<h1>A <p>P</p> C </h1>', heading_style=ATX) == '# A P C\n'
 
 
 def test_hn_nested_simple_tag():
@@ -143,7 +144,7 @@ def test_hn_nested_simple_tag():
     for tag, markdown in tag_to_markdown:
         assert md('<h3>A <' + tag + '>' + tag + '</' + tag + '> B</h3>') == '### A ' + markdown + ' B\n'
 
-    # assert md('<h3>A <br>B</h3>', heading_style=ATX) == '### A B\n\n'
+    assert md('<h3>A <br>B</h3>', heading_style=ATX) == '### A B\n'
 
     # Nested lists not supported
     # assert md('<h3>A <ul><li>li1</i><li>l2</li></ul></h3>', heading_style=ATX) == '### A li1 li2 B\n\n'
@@ -157,17 +158,17 @@ def test_hn_nested_img():
     ]
     for image_attributes, markdown, title in image_attributes_to_markdown:
         assert md('<h3>A <img src="/path/to/img.jpg" ' + image_attributes + '/> B</h3>') == '### A ' + markdown + ' B\n'
-        # assert md('<h3>A <img src="/path/to/img.jpg" ' + image_attributes + '/> B</h3>', keep_inline_images_in=['h3']) == '### A ![' + markdown + '](/path/to/img.jpg' + title + ') B\n\n'
+        assert md('<h3>A <img src="/path/to/img.jpg" ' + image_attributes + '/> B</h3>', keep_inline_images_in=['h3']) == '### A ![' + markdown + '](/path/to/img.jpg' + title + ') B\n'
 
 
-# def test_hn_atx_headings():
-#     assert md('<h1>Hello</h1>', heading_style=ATX) == '# Hello\n\n'
-#     assert md('<h2>Hello</h2>', heading_style=ATX) == '## Hello\n\n'
+def test_hn_atx_headings():
+    assert md('<h1>Hello</h1>', heading_style=ATX) == '# Hello\n'
+    assert md('<h2>Hello</h2>', heading_style=ATX) == '## Hello\n'
 
 
-# def test_hn_atx_closed_headings():
-#     assert md('<h1>Hello</h1>', heading_style=ATX_CLOSED) == '# Hello #\n\n'
-#     assert md('<h2>Hello</h2>', heading_style=ATX_CLOSED) == '## Hello ##\n\n'
+def test_hn_atx_closed_headings():
+    assert md('<h1>Hello</h1>', heading_style=ATX_CLOSED) == '# Hello #\n'
+    assert md('<h2>Hello</h2>', heading_style=ATX_CLOSED) == '## Hello ##\n'
 
 
 def test_head():
@@ -196,10 +197,10 @@ def test_kbd():
 def test_p():
     assert md('<p>hello</p>') == 'hello\n'
     assert md('<p>123456789 123456789</p>') == '123456789 123456789\n'
-    # assert md('<p>123456789 123456789</p>', wrap=True, wrap_width=10) == '123456789\n123456789\n\n'
-    # assert md('<p><a href="https://example.com">Some long link</a></p>', wrap=True, wrap_width=10) == '[Some long\nlink](https://example.com)\n\n'
-    # assert md('<p>12345<br />67890</p>', wrap=True, wrap_width=10, newline_style=BACKSLASH) == '12345\\\n67890\n\n'
-    # assert md('<p>12345678901<br />12345</p>', wrap=True, wrap_width=10, newline_style=BACKSLASH) == '12345678901\\\n12345\n\n'
+    assert md('<p>123456789 123456789</p>', wrap=True, wrap_width=10) == '123456789\n123456789\n'
+    assert md('<p><a href="https://example.com">Some long link</a></p>', wrap=True, wrap_width=10) == '[Some long\nlink](https://example.com)\n'
+    assert md('<p>12345<br />67890</p>', wrap=True, wrap_width=10, newline_style=BACKSLASH) == '12345\\\n67890\n'
+    assert md('<p>12345678901<br />12345</p>', wrap=True, wrap_width=10, newline_style=BACKSLASH) == '12345678901\\\n12345\n'
 
 
 def test_pre():
@@ -220,35 +221,39 @@ def test_strong():
     assert md('<strong>Hello</strong>') == '**Hello**'
 
 
-# def test_strong_em_symbol():
-#     assert md('<strong>Hello</strong>', strong_em_symbol=UNDERSCORE) == '__Hello__'
-#     assert md('<b>Hello</b>', strong_em_symbol=UNDERSCORE) == '__Hello__'
-#     assert md('<em>Hello</em>', strong_em_symbol=UNDERSCORE) == '_Hello_'
-#     assert md('<i>Hello</i>', strong_em_symbol=UNDERSCORE) == '_Hello_'
+def test_strong_em_symbol():
+    assert md('<strong>Hello</strong>', strong_em_symbol=UNDERSCORE) == '__Hello__'
+    assert md('<b>Hello</b>', strong_em_symbol=UNDERSCORE) == '__Hello__'
+    assert md('<em>Hello</em>', strong_em_symbol=UNDERSCORE) == '_Hello_'
+    assert md('<i>Hello</i>', strong_em_symbol=UNDERSCORE) == '_Hello_'
 
 
 def test_sub():
     assert md('<sub>foo</sub>') == 'foo'
-    # assert md('<sub>foo</sub>', sub_symbol='~') == '~foo~'
+    assert md('<sub>foo</sub>', sub_symbol='~') == '~foo~'
 
 
 def test_sup():
     assert md('<sup>foo</sup>') == 'foo'
-    # assert md('<sup>foo</sup>', sup_symbol='^') == '^foo^'
+    assert md('<sup>foo</sup>', sup_symbol='^') == '^foo^'
 
 
-# def test_lang():
-#     assert md('<pre>test\n    foo\nbar</pre>', code_language='python') == '\n```python\ntest\n    foo\nbar\n```\n'
-#     assert md('<pre><code>test\n    foo\nbar</code></pre>', code_language='javascript') == '\n```javascript\ntest\n    foo\nbar\n```\n'
+def test_lang():
+    assert md('<pre>test\n    foo\nbar</pre>', code_language='python') == '\n```python\ntest\n    foo\nbar\n```\n'
+    assert md('<pre><code>test\n    foo\nbar</code></pre>', code_language='javascript') == '\n```javascript\ntest\n    foo\nbar\n```\n'
+    assert md('<pre class="python">test</pre>', code_language='javascript') == '\n```python\ntest\n```\n'
 
 
-# def test_lang_callback():
-#     def callback(el):
-#         return el['class'][0] if el.has_attr('class') else None
+def test_lang_callback():
+    def callback(el):
+        return el['class'][0] if el.has_attr('class') else None
+
+    assert md('<pre class="python">test\n    foo\nbar</pre>', code_language_callback=callback) == '\n```python\ntest\n    foo\nbar\n```\n'
+    assert md('<pre class="javascript"><code>test\n    foo\nbar</code></pre>', code_language_callback=callback) == '\n```javascript\ntest\n    foo\nbar\n```\n'
+    assert md('<pre class="javascript"><code class="javascript">test\n    foo\nbar</code></pre>', code_language_callback=callback) == '\n```javascript\ntest\n    foo\nbar\n```\n'
+    assert markdownify_lxml('<pre class="python">test</pre>', code_language_callback=callback) == '\n```python\ntest\n```\n'
+    assert md('<pre class="python">test</pre>', code_language_callback=lambda el: None) == '\n```\ntest\n```\n'
 
-#     assert md('<pre class="python">test\n    foo\nbar</pre>', code_language_callback=callback) == '\n```python\ntest\n    foo\nbar\n```\n'
-#     assert md('<pre class="javascript"><code>test\n    foo\nbar</code></pre>', code_language_callback=callback) == '\n```javascript\ntest\n    foo\nbar\n```\n'
-#     assert md('<pre class="javascript"><code class="javascript">test\n    foo\nbar</code></pre>', code_language_callback=callback) == '\n```javascript\ntest\n    foo\nbar\n```\n'
 
 def test_lang_callback2():
     assert md('<pre class="python">test\n    foo\nbar</pre>') == '\n```python\ntest\n    foo\nbar\n```\n'
@@ -323,3 +328,8 @@ Note that you can modify the `replacements` map to include additional placeholde
 
     assert md(code) == check_code
 pass
+
+
+def test_many_codeblocks():
+    html = '<p>x</p><pre><div><span>python</span><button>Copy code</button></div><code><span>a</span> = 1</code></pre>' * 500
+    assert md(html) == 'x\n\n```python\na = 1\n```\n' * 500
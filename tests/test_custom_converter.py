@@ -1,25 +1,66 @@
-# from markdownify import MarkdownConverter
-# from bs4 import BeautifulSoup
+import pickle
 
+from bs4 import BeautifulSoup
+from lxml import html as lxml_html
 
-# class ImageBlockConverter(MarkdownConverter):
-#     """
-#     Create a custom MarkdownConverter that adds two newlines after an image
-#     """
-#     def convert_img(self, el, text, convert_as_inline):
-#         return super().convert_img(el, text, convert_as_inline) + '\n\n'
+from markdownify import ATX, MarkdownConverter, MemoryCache, markdownify_many
 
 
-# def test_img():
-#     # Create shorthand method for conversion
-#     def md(html, **options):
-#         return ImageBlockConverter(**options).convert(html)
+class ImageBlockConverter(MarkdownConverter):
+    """
+    Create a custom MarkdownConverter that adds two newlines after an image
+    """
+    def convert_img(self, el, text, as_inline, ctx):
+        return super().convert_img(el, text, as_inline, ctx) + '\n\n'
 
-#     assert md('<img src="/path/to/img.jpg" alt="Alt text" title="Optional title" />') == '![Alt text](/path/to/img.jpg "Optional title")\n\n'
-#     assert md('<img src="/path/to/img.jpg" alt="Alt text" />') == '![Alt text](/path/to/img.jpg)\n\n'
 
+def test_img():
+    # Create shorthand method for conversion
+    def md(html, **options):
+        return ImageBlockConverter(**options).convert(html)
 
-# def test_soup():
-#     html = '<b>test</b>'
-#     soup = BeautifulSoup(html, 'html.parser')
-#     assert MarkdownConverter().convert_soup(soup) == '**test**'
+    assert md('<img src="/path/to/img.jpg" alt="Alt text" title="Optional title" />') == '![Alt text](/path/to/img.jpg "Optional title")\n\n'
+    assert md('<img src="/path/to/img.jpg" alt="Alt text" />') == '![Alt text](/path/to/img.jpg)\n\n'
+
+
+def test_soup():
+    html = '<b>test</b>'
+    soup = BeautifulSoup(html, 'html.parser')
+    assert MarkdownConverter().convert_soup(soup) == '**test**'
+    assert MarkdownConverter().convert_soup(lxml_html.document_fromstring(html)) == '**test**'
+
+
+def test_options():
+    converter = MarkdownConverter(engine='lxml', heading_style=ATX, bullets='-')
+    assert converter('<h1>A</h1><ul><li>b</li></ul>') == '# A\n- b\n'
+    assert converter.convert('<h2>C</h2>') == '## C\n'
+
+
+def test_immutable():
+    converter = MarkdownConverter(heading_style=ATX)
+    try:
+        converter.engine = 'lxml'
+    except AttributeError:
+        pass
+    else:
+        assert False, 'a converter can be changed'
+
+
+def test_pickle():
+    converter = pickle.loads(pickle.dumps(ImageBlockConverter(engine='fast', heading_style=ATX)))
+    assert type(converter) is ImageBlockConverter
+    assert converter('<h1>A</h1><img src="a.png" alt="a">') == '# A\n![a](a.png)\n\n'
+
+
+def test_many():
+    docs = ['<h1>%d</h1>' % i for i in range(8)]
+    converter = MarkdownConverter(engine='lxml', heading_style=ATX)
+    assert markdownify_many(docs, workers=2, converter=converter) == ['# %d\n' % i for i in range(8)]
+
+
+def test_cache():
+    cache = MemoryCache()
+    html = '<h1>A</h1><img src="a.png">'
+    assert MarkdownConverter(heading_style=ATX).convert(html, cache=cache) == '# A\n![](a.png)'
+    assert ImageBlockConverter(heading_style=ATX).convert(html, cache=cache) == '# A\n![](a.png)\n\n'
+    assert cache.misses == 2
@@ -0,0 +1,65 @@
+import codecs
+import mmap
+
+from markdownify import Limits, MarkdownConverter, MemoryCache, markdownify, markdownify_fast, markdownify_lxml
+from markdownify import sniff_encoding
+
+ENGINES = (markdownify, markdownify_fast, markdownify_lxml)
+
+page = ('<html><head><meta charset="windows-1252"><title>Café</title></head>'
+        '<body><h1>Café</h1><pre><span>x = "ü"</span></pre><p>naïve</p></body></html>')
+plain = page.replace(' charset="windows-1252"', '')
+utf8 = page.replace('windows-1252', 'utf-8')
+
+
+def test_sniff_encoding():
+    assert sniff_encoding(codecs.BOM_UTF8 + b'<p>') == ('utf-8', 3)
+    assert sniff_encoding(codecs.BOM_UTF16_LE + b'<\x00', 'cp1252') == ('utf-16-le', 2)
+    assert sniff_encoding(page.encode('cp1252')) == ('cp1252', 0)
+    assert sniff_encoding(page.encode('cp1252'), 'koi8-r') == ('koi8-r', 0)
+    assert sniff_encoding(page.encode('cp1252'), 'no-such-charset') == ('cp1252', 0)
+    assert sniff_encoding(b'<meta http-equiv="Content-Type" content="text/html; charset=Shift_JIS">') == ('shift_jis', 0)
+    assert sniff_encoding(b'<meta charset="utf-16">') == ('utf-8', 0)
+    assert sniff_encoding(b'<p>', 'latin-1') == ('cp1252', 0)
+    assert sniff_encoding(b'<p>') == ('utf-8', 0)
+
+
+def test_bytes():
+    for md in ENGINES:
+        expected = md(page)
+        assert md(page.encode('cp1252')) == expected
+        assert md(bytearray(page.encode('cp1252'))) == expected
+        assert md(memoryview(page.encode('cp1252'))) == expected
+        assert md(plain.encode('cp1252'), encoding='cp1252') == md(plain)
+        assert md(utf8.encode()) == md(codecs.BOM_UTF8 + utf8.encode()) == md(utf8)
+        assert md(codecs.BOM_UTF16_LE + utf8.encode('utf-16-le')) == md(utf8)
+        # a BOM outweighs the hint, and the hint outweighs <meta>
+        assert md(codecs.BOM_UTF8 + utf8.encode(), encoding='cp1252') == md(utf8)
+        assert md(utf8.encode(), encoding='cp1252') != md(utf8)
+        assert md(b'') == ''
+
+
+def test_mmap(tmp_path):
+    path = tmp_path / 'page.html'
+    path.write_bytes(page.encode('cp1252'))
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for md in ENGINES:
+            assert md(data) == md(page)
+
+
+def test_encoding_unknown_to_lxml():
+    assert markdownify_lxml('<p>テスト</p>'.encode('iso2022_jp'), encoding='iso2022_jp') == 'テスト\n'
+    assert markdownify_fast('<p>テスト</p>'.encode('iso2022_jp'), encoding='iso2022_jp') == 'テスト\n'
+
+
+def test_converter_cache_and_limits():
+    converter = MarkdownConverter('lxml')
+    cache = MemoryCache()
+    assert converter(plain.encode('cp1252'), cache=cache, encoding='cp1252') == converter(plain)
+    # the encoding is part of the key
+    assert converter(plain.encode('cp1252'), cache=cache, encoding='koi8-r') != converter(plain)
+    assert converter(plain.encode('cp1252'), cache=cache, encoding='cp1252') == converter(plain)
+    assert (cache.hits, cache.misses) == (1, 2)
+    data = page.encode('cp1252')
+    assert markdownify_lxml(data, limits=Limits(max_bytes=len(data))) == markdownify_lxml(page)
+    assert markdownify_lxml(data, limits=Limits(max_bytes=len(data) - 1, truncate=True)).truncated == 'max_bytes'
@@ -3,12 +3,12 @@ from markdownify import markdownify as md
 
 def test_asterisks():
     assert md('*hey*dude*') == r'\*hey\*dude\*'
-    # assert md('*hey*dude*', escape_asterisks=False) == r'*hey*dude*'
+    assert md('*hey*dude*', escape_asterisks=False) == r'*hey*dude*'
 
 
 def test_underscore():
     assert md('_hey_dude_') == r'\_hey\_dude\_'
-    # assert md('_hey_dude_', escape_underscores=False) == r'_hey_dude_'
+    assert md('_hey_dude_', escape_underscores=False) == r'_hey_dude_'
 
 
 def test_xml_entities():
@@ -26,3 +26,24 @@ def test_hexadecimal_entities():
 
 def test_single_escaping_entities():
     assert md('&amp;amp;') == '&amp;'
+
+
+def test_escape_chars():
+    assert md('# [a] > b | c', escape_chars='#[]>|') == r'\# \[a\] \> b \| c'
+    assert md(r'a\b_', escape_chars='\\') == r'a\\b\_'
+    assert md('<code>[a]_</code>', escape_chars='[]') == '`[a]_`'
+    assert md('*_', escape_asterisks=False, escape_underscores=False) == '*_'
+
+
+def test_escape_whitespace():
+    assert md('<p>a \t  b_</p>') == 'a b\\_\n'
+    assert md('<pre>a \t  b_</pre>') == '\n```\na \t  b_\n```\n'
+
+
+def test_unknown_option():
+    try:
+        md('a', escape_everything=True)
+    except TypeError:
+        pass
+    else:
+        assert False
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+
+import markdownify
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(markdownify.__file__)))
+
+# Imported only on first use, never by import markdownify
+LAZY_MODULES = ('bs4', 'lxml', 'asyncio', 'sqlite3', 'concurrent.futures', 'multiprocessing', 'textwrap',
+                'markdownify.aio', 'markdownify.batch', 'markdownify.cache', 'markdownify.stats', 'markdownify.stream')
+
+# python -X importtime puts import markdownify at about 11ms from bytecode and 30ms compiling the source,
+# against 170ms when it imported BeautifulSoup, lxml and asyncio up front
+IMPORT_BUDGET_US = 60000
+
+
+def run(*args):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    return subprocess.run([sys.executable, *args], env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+
+
+def imported_modules(code):
+    """Return the modules loaded after running code in a fresh interpreter."""
+    return set(run('-c', code + '\nimport sys; print(*sys.modules)').stdout.split())
+
+
+def import_time():
+    """Return the cumulative microseconds python -X importtime gives import markdownify."""
+    for line in run('-X', 'importtime', '-c', 'import markdownify').stderr.splitlines():
+        if line.startswith('import time:') and line.split('|')[-1].strip() == 'markdownify':
+            return int(line.split('|')[1])
+
+
+def is_lazy(name):
+    return any(name == lazy or name.startswith(lazy + '.') for lazy in LAZY_MODULES)
+
+
+def test_import_is_lazy():
+    assert sorted(filter(is_lazy, imported_modules('import markdownify'))) == []
+
+
+def test_import_budget():
+    assert min(import_time() for _ in range(3)) < IMPORT_BUDGET_US
+
+
+def test_lxml_engine_skips_bs4():
+    imported = imported_modules('import markdownify; markdownify.markdownify_lxml("<p>a<!-- b --></p>")')
+    assert 'lxml.etree' in imported
+    assert 'bs4' not in imported
+
+
+def test_lazy_names():
+    for name in markdownify.LAZY_NAMES:
+        assert getattr(markdownify, name) is not None
+        assert name in dir(markdownify)
+    names = {}
+    exec('from markdownify import *', names)
+    assert 'MemoryCache' in names and 'markdownify_lxml' in names
+    # neither the modules it imports nor the proxies of those it imports lazily
+    assert not {'sys', 're', 'bs4', 'etree', 'PARSERS', 'import_bs4'} & set(names)
+    assert all(hasattr(markdownify, name) for name in markdownify.__all__)
+    try:
+        markdownify.no_such_name
+    except AttributeError:
+        pass
+    else:
+        assert False, 'unknown names must raise AttributeError'
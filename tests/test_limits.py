@@ -0,0 +1,83 @@
+import pickle
+
+import pytest
+
+from markdownify import (LimitExceeded, Limits, MarkdownConverter, MemoryCache, PartialMarkdown, SqliteCache, markdownify,
+                         markdownify_fast, markdownify_lxml, markdownify_many, markdownify_tree)
+
+ENGINES = (markdownify, markdownify_fast, markdownify_lxml)
+
+page = '<p>Intro</p><ul>' + '<li>item</li>' * 200 + '</ul>'
+deep = '<p>Intro</p>' + '<div>' * 40 + 'deep' + '</div>' * 40
+
+
+def test_within_limits():
+    limits = Limits(max_bytes=1 << 20, max_nodes=10000, max_depth=100, timeout=60)
+    for md in ENGINES:
+        text = md(page, limits=limits)
+        assert type(text) is str
+        assert text == md(page)
+
+
+def test_raise():
+    for md in ENGINES:
+        for limits, limit in ((Limits(max_nodes=10), 'max_nodes'), (Limits(max_depth=10), 'max_depth'),
+                              (Limits(max_bytes=100), 'max_bytes')):
+            with pytest.raises(LimitExceeded) as info:
+                md(page + deep, limits=limits)
+            assert info.value.limit == limit
+            assert info.value.value == getattr(limits, limit)
+
+
+def test_truncate():
+    for md in ENGINES:
+        text = md(page, limits=Limits(max_nodes=20, truncate=True))
+        assert isinstance(text, PartialMarkdown) and text.truncated == 'max_nodes'
+        assert text.startswith('Intro\n* item\n') and text.count('* item') < 20
+        assert md(deep, limits=Limits(max_depth=10, truncate=True)) == PartialMarkdown('Intro\n', 'max_depth')
+        assert md(page, limits=Limits(max_bytes=12, truncate=True)).truncated == 'max_bytes'
+
+
+def test_timeout():
+    text = markdownify_lxml('<ul>' + '<li>item</li>' * 5000 + '</ul>', limits=Limits(timeout=0, truncate=True))
+    assert text.truncated == 'timeout'
+    assert 0 < text.count('* item') < 5000
+
+
+def test_max_bytes_counts_utf8():
+    assert type(markdownify_lxml('é' * 10, limits=Limits(max_bytes=20))) is str
+    assert markdownify_lxml('é' * 10, limits=Limits(max_bytes=19, truncate=True)) == 'é' * 9
+
+
+def test_partial_results_are_not_cached():
+    cache = MemoryCache()
+    limits = Limits(max_nodes=20, truncate=True)
+    assert markdownify_lxml(page, cache=cache, limits=limits).truncated == 'max_nodes'
+    assert len(cache) == 0
+    assert markdownify_lxml(page, cache=cache) == markdownify_lxml(page)
+
+
+def test_tree_and_converter():
+    from lxml import html as lxml_html
+    tree = lxml_html.document_fromstring(page)
+    assert markdownify_tree(tree, limits=Limits(max_nodes=20, truncate=True)).truncated == 'max_nodes'
+
+    converter = pickle.loads(pickle.dumps(MarkdownConverter('lxml', Limits(max_nodes=20, truncate=True))))
+    assert converter(page).truncated == 'max_nodes'
+    assert type(converter(page, limits=Limits())) is str
+    assert pickle.loads(pickle.dumps(converter(page))).truncated == 'max_nodes'
+
+
+def test_many():
+    docs = [page, '<p>small</p>', page]
+    results = markdownify_many(docs, workers=2, converter=MarkdownConverter('lxml', Limits(max_nodes=50)))
+    assert [type(result) for result in results] == [LimitExceeded, str, LimitExceeded]
+    assert results[1] == 'small\n'
+
+
+def test_many_does_not_cache_partial_results(tmp_path):
+    converter = MarkdownConverter('lxml', Limits(max_nodes=20, truncate=True))
+    cache = SqliteCache(tmp_path / 'cache.db')
+    for _ in range(2):
+        assert markdownify_many([page], workers=1, converter=converter, cache=cache)[0].truncated == 'max_nodes'
+    assert len(cache) == 0
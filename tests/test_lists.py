@@ -73,9 +73,15 @@ def test_nested_uls():
     assert md(nested_uls) == '\n* 1\n\t+ a\n\t\t- I\n\t\t- II\n\t\t- III\n\t+ b\n\t+ c\n* 2\n* 3\n'
 
 
-# def test_bullets():
-#     assert md(nested_uls, bullets='-') == '\n- 1\n\t- a\n\t\t- I\n\t\t- II\n\t\t- III\n\t- b\n\t- c\n- 2\n- 3\n'
+def test_bullets():
+    assert md(nested_uls, bullets='-') == '\n- 1\n\t- a\n\t\t- I\n\t\t- II\n\t\t- III\n\t- b\n\t- c\n- 2\n- 3\n'
+    assert md(nested_uls, bullets=['-', '*']) == '\n- 1\n\t* a\n\t\t- I\n\t\t- II\n\t\t- III\n\t* b\n\t* c\n- 2\n- 3\n'
 
 
 def test_li_text():
     assert md('<ul><li>foo <a href="#">bar</a></li><li>foo bar  </li><li>foo <b>bar</b>   <i>space</i>.</ul>') == '* foo [bar](#)\n* foo bar\n* foo **bar** *space*.\n'
+
+
+def test_long_ol():
+    text = md('<ol start="5">' + '<li>x</li>\n' * 1000 + '</ol>')
+    assert text == ''.join(f'{i}. x\n' for i in range(5, 1005))
@@ -0,0 +1,43 @@
+from markdownify import markdownify_fast, markdownify_lxml as md
+from .test_lists import nested_uls, nested_ols
+from .test_tables import table, table_head_body, table_body, table_missing_text
+
+
+def test_matches_markdownify_fast():
+    for html in [
+        '<p>This is an <a href="http://example.com/">example link</a>.</p>',
+        '<blockquote>And she was like <blockquote>Hello</blockquote></blockquote>',
+        '<h1>Hello</h1><h3>A <img src="/img.jpg" alt="Alt"/> B</h3>',
+        '<pre class="python">test\n    foo\nbar</pre>',
+        '<p>foo</p><ul><li>a</li><li>b</li></ul><p>bar</p>',
+        '<div><hr>  \n<ul><li>w</li></ul></div><pre>  \n</pre>',
+        nested_uls, nested_ols,
+        table, table_head_body, table_body, table_missing_text,
+    ]:
+        assert md(html) == markdownify_fast(html)
+
+
+def test_text_and_tail():
+    assert md('a<b>b</b>c<i>d</i>e') == 'a**b**c*d*e'
+    assert md('*hey*dude_') == r'\*hey\*dude\_'
+
+
+def test_ol_counts_text_siblings():
+    assert md('<ol><li>a</li>x<li>b</li></ol>') == '1. a\nx3. b\n'
+
+
+def test_comments():
+    assert md('<!-- comment --><p>a<!-- inner -->b</p>') == 'ab\n'
+
+
+def test_empty():
+    assert md('') == ''
+    assert md('   ') == ''
+
+
+def test_deep_nesting():
+    assert md('<div>' * 1500 + 'deep' + '</div>' * 1500) == 'deep'
+    # past libxml2's limit of 2048 levels, lxml drops the rest of the page, so BeautifulSoup's tree is walked
+    html = '<p>before</p>' + '<div>' * 2100 + 'x_y' + '</div>' * 2100 + '<p>after</p>'
+    assert md(html) == md(html.encode()) == markdownify_fast(html) == 'before\nx\\_yafter\n'
+    assert md(html, select='p') == 'before\nafter\n'
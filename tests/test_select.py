@@ -0,0 +1,90 @@
+import pickle
+
+import pytest
+
+from markdownify import (LimitExceeded, Limits, MarkdownConverter, MemoryCache, markdownify, markdownify_fast,
+                         markdownify_lxml, markdownify_tree)
+
+page = ('<html><head><title>Title</title></head><body>'
+        '<nav><a href="/">Home</a></nav>'
+        '<article><h1>Post</h1><p>Some <b>text</b></p><article><p>nested</p></article></article>'
+        '<aside><p class="note">one</p></aside><p class="note">two</p>'
+        '<footer>Footer</footer></body></html>')
+article = 'Post\n====\nSome **text**\nnested\n'
+
+
+def test_select():
+    body = '<html><body>%s</body></html>' % page[page.index('<article>'):page.index('<aside>')]
+    for md in (markdownify_fast, markdownify_lxml):
+        assert md(page, select='//article') == md(body) == article
+        assert md(page, select='//p[@class="note"]') == 'one\ntwo\n'
+        assert md(page, select='//table') == ''
+    assert markdownify(page, select='article') == markdownify(body) == article
+    assert markdownify(page, select='p.note') == 'one\ntwo\n'
+    assert markdownify(page, select='table') == ''
+
+
+def test_css_with_lxml():
+    pytest.importorskip('cssselect')
+    for md in (markdownify_fast, markdownify_lxml):
+        assert md(page, select='article') == article
+        assert md(page, select='p.note') == 'one\ntwo\n'
+
+
+def test_xpath_needs_lxml():
+    with pytest.raises(ValueError):
+        markdownify(page, select='//article')
+    with pytest.raises(ValueError):
+        MarkdownConverter(select='//article')
+    with pytest.raises(ValueError):
+        markdownify_lxml(page, select='(count(//p))')
+
+
+def test_tree():
+    from bs4 import BeautifulSoup
+    from lxml import html as lxml_html
+    soup = BeautifulSoup(page, 'html.parser')
+    assert markdownify_tree(soup, select='article') == article
+    tree = lxml_html.document_fromstring(page)
+    assert markdownify_tree(tree, select='//article') == article
+    # the tree is left as it was
+    assert markdownify_tree(soup) == markdownify(page)
+    assert markdownify_tree(tree) == markdownify_lxml(page)
+    assert markdownify_tree(tree, select='//p', limits=Limits(max_nodes=3, truncate=True)).truncated == 'max_nodes'
+
+
+def test_converter():
+    converter = MarkdownConverter('lxml', select='//article')
+    assert converter(page) == article
+    assert pickle.loads(pickle.dumps(converter))(page) == article
+    assert 'select=' in repr(converter)
+
+
+def test_cache_and_limits():
+    cache = MemoryCache()
+    assert markdownify_lxml(page, cache=cache, select='//article') == article
+    assert markdownify_lxml(page, cache=cache) == markdownify_lxml(page)
+    assert len(cache) == 2
+    # only the selected elements count against the limits
+    assert markdownify_lxml(page, select='//footer', limits=Limits(max_nodes=2)) == 'Footer'
+    with pytest.raises(LimitExceeded):
+        markdownify_lxml(page, limits=Limits(max_nodes=2))
+
+
+def test_tree_parents():
+    from bs4 import BeautifulSoup
+    from lxml import html as lxml_html
+    html = '<p>Run <code>x_y</code></p><table><tr><th>a</th></tr><tr><td>1</td></tr></table>'
+    for xpath, css in (('//code', 'code'), ('//tr', 'tr')):
+        expected = markdownify_lxml(html, select=xpath)
+        assert markdownify_tree(lxml_html.document_fromstring(html), select=xpath) == expected
+        assert markdownify_tree(BeautifulSoup(html, 'html.parser'), select=css) == markdownify(html, select=css) == expected
+    assert markdownify_lxml(html, select='//code') == '`x_y`'
+
+
+def test_fast_selects_in_place():
+    # the matches are converted where lxml parsed them, with the rest of the page, not parsed again on their own
+    html = '<body><ul><li></li>x y</ul><p>after</p></body>'
+    assert markdownify_fast(html, select='//ul') == markdownify_lxml(html, select='//ul') == '* \nx y'
+    assert markdownify(html, select='ul') == '* \nx y'
+    assert markdownify_fast(page.encode(), select='//p[@class="note"]') == 'one\ntwo\n'
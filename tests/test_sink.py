@@ -0,0 +1,86 @@
+import gzip
+import io
+
+import pytest
+
+from markdownify import (ConversionStats, Limits, MarkdownConverter, MemoryCache, markdownify, markdownify_fast,
+                         markdownify_lxml, markdownify_tree)
+
+ENGINES = (markdownify, markdownify_fast, markdownify_lxml)
+
+page = ('<html><head><title>Title</title></head><body><div><h1>Heading</h1><p>Some <b>bold</b> text.</p>'
+        '<ul><li>a</li><li>b</li></ul></div><table><tr><th>x</th></tr><tr><td>1</td></tr></table>'
+        '<blockquote><p>quoted</p></blockquote>tail</body></html>')
+
+
+def test_sinks():
+    for md in ENGINES:
+        expected = md(page)
+        parts = []
+        assert md(page, sink=parts) is None
+        # each block is written as soon as it is converted
+        assert ''.join(parts) == expected and len(parts) > 3 and '' not in parts
+        out = io.StringIO()
+        md(page, sink=out)
+        assert out.getvalue() == expected
+        calls = []
+        md(page, sink=calls.append)
+        assert calls == parts
+
+
+def test_bad_sink():
+    with pytest.raises(TypeError):
+        markdownify_lxml(page, sink=42)
+
+
+def test_compressed():
+    data = io.BytesIO()
+    with gzip.open(data, 'wt', encoding='utf-8') as f:
+        markdownify_lxml(page, sink=f)
+    assert gzip.decompress(data.getvalue()).decode() == markdownify_lxml(page)
+
+
+def test_cache_stats_and_options():
+    cache = MemoryCache()
+    for _ in range(2):
+        parts = []
+        markdownify_lxml(page, cache=cache, sink=parts)
+        assert ''.join(parts) == markdownify_lxml(page)
+    assert (cache.hits, cache.misses) == (1, 1)
+    parts = []
+    markdownify_fast(page, stats=ConversionStats(), heading_style='atx', sink=parts)
+    assert ''.join(parts) == markdownify_fast(page, heading_style='atx')
+
+
+def test_limits():
+    parts = []
+    assert markdownify_lxml(page, limits=Limits(max_nodes=8, truncate=True), sink=parts) == 'max_nodes'
+    assert ''.join(parts) == markdownify_lxml(page, limits=Limits(max_nodes=8, truncate=True))
+
+
+def test_tree_and_converter():
+    from lxml import html as lxml_html
+    parts = []
+    assert markdownify_tree(lxml_html.document_fromstring(page), sink=parts) is None
+    assert ''.join(parts) == markdownify_lxml(page)
+    converter = MarkdownConverter('lxml', bullets='-')
+    parts = []
+    converter(page, sink=parts)
+    assert ''.join(parts) == converter(page)
+    parts = []
+    converter.convert_soup(lxml_html.document_fromstring(page), sink=parts)
+    assert ''.join(parts) == converter(page)
+
+
+def test_select():
+    from bs4 import BeautifulSoup
+    from lxml import html as lxml_html
+    # the matches' own converters still run: the quote keeps its markers, the heading its underline
+    for select, expected in (('//blockquote', '\n> quoted\n'), ('//h1', 'Heading\n=======\n'),
+                             ('//div', markdownify_tree(lxml_html.document_fromstring(page), select='//div'))):
+        parts = []
+        assert markdownify_tree(lxml_html.document_fromstring(page), select=select, sink=parts) is None
+        assert ''.join(parts) == expected
+    parts = []
+    MarkdownConverter(select='blockquote').convert_soup(BeautifulSoup(page, 'html.parser'), sink=parts)
+    assert ''.join(parts) == '\n> quoted\n'
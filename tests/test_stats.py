@@ -0,0 +1,35 @@
+from markdownify import ConversionStats, markdownify, markdownify_fast, markdownify_lxml
+
+html = '<p>a <b>b</b> c</p><ol><li>one</li><li>two <i>x</i></li></ol><div><div><div>deep</div></div></div>'
+
+
+def test_stats_do_not_change_output():
+    for convert in (markdownify, markdownify_fast, markdownify_lxml):
+        assert convert(html, stats=ConversionStats()) == convert(html)
+
+
+def test_stats_counts():
+    stats = ConversionStats()
+    markdownify_lxml(html, stats=stats)
+    assert stats.calls['convert_li'] == 2
+    assert stats.calls['convert_list'] == 1
+    assert stats.calls['convert_em'] == 1
+    assert stats.calls['p'] == 1
+    assert stats.calls['process_text'] == 7
+    assert set(stats.seconds) == set(stats.calls)
+    assert set(stats.phases) == {'cleanup_code', 'parse', 'traverse'}
+    # body > div > div > div, below the html root
+    assert stats.max_depth == 4
+    assert stats.nodes == 17
+    assert stats.conversions == 1
+
+
+def test_stats_merge():
+    total = ConversionStats()
+    for _ in range(3):
+        stats = ConversionStats()
+        markdownify_fast(html, stats=stats)
+        total.merge(stats)
+    assert total.conversions == 3
+    assert total.calls['convert_li'] == 6
+    assert total.as_dict()['nodes'] == 3 * stats.nodes
@@ -0,0 +1,118 @@
+import codecs
+import io
+
+import pytest
+
+from markdownify import ATX, NestingTooDeep, cleanup_code, iter_cleanup_code, markdownify_file, markdownify_lxml, markdownify_stream
+from .test_lists import nested_ols
+from .test_tables import table
+
+
+page = f"""<html><head><title>Title</title></head>
+<body>
+<h1>Heading</h1>
+<p>Some <b>bold</b> text_here.</p>
+<ul><li>a</li><li>b</li></ul>
+<p>after the list</p>
+<pre class="python"><span>def f():</span>
+    return 1</pre>
+{nested_ols}
+{table}
+tail text
+</body></html>"""
+
+
+def chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_stream_matches_whole_document():
+    for size in (1, 3, 17, 100, len(page)):
+        assert ''.join(markdownify_stream(chunks(page, size))) == markdownify_lxml(page)
+
+
+def test_stream_yields_blocks():
+    pieces = list(markdownify_stream(chunks(page, 10)))
+    assert len(pieces) > 5
+    assert pieces[0] == 'Title\n'
+
+
+def test_stream_file_object():
+    assert ''.join(markdownify_stream(io.StringIO(page), chunk_size=16)) == markdownify_lxml(page)
+
+
+def test_stream_pre_split_across_chunks():
+    html = '<p>a</p><pre><div><span>java</span><button>Copy code</button></div><code>x = 1</code></pre><p>b</p>'
+    for size in range(1, 12):
+        assert ''.join(markdownify_stream(chunks(html, size))) == markdownify_lxml(html)
+
+
+def test_iter_cleanup_code():
+    html = '<p>a</p><pre><span>x</span></pre><p>b</p><pre><div>y</div></pre>' * 3
+    for size in range(1, 12):
+        assert ''.join(iter_cleanup_code(chunks(html, size))) == cleanup_code(html)
+        assert b''.join(iter_cleanup_code(chunks(html.encode(), size), 'utf-8')) == cleanup_code(html).encode()
+    # a <pre> block longer than max_pre goes out as it is, without waiting for its end
+    read = []
+    source = (read.append(chunk) or chunk for chunk in ['<p>a</p>', '<pre>'] + ['<span>x</span>'] * 100)
+    pieces = iter_cleanup_code(source, max_pre=50)
+    assert ''.join(next(pieces) for _ in range(7)) == '<p>a</p><pre>' + '<span>x</span>' * 4
+    assert len(read) == 6
+
+
+def test_stream_empty():
+    assert list(markdownify_stream([])) == []
+    assert list(markdownify_stream(['  '])) == []
+    assert ''.join(markdownify_stream(['<p>only</p>'])) == 'only\n'
+
+
+def test_stream_bytes():
+    encoded = page.replace('<head>', '<head><meta charset="koi8-r">').replace('Heading', 'Заголовок')
+    expected = markdownify_lxml(encoded)
+    data = encoded.encode('koi8-r')
+    for size in (1, 7, 100, len(data)):
+        assert ''.join(markdownify_stream(chunks(data, size))) == expected
+        assert ''.join(markdownify_stream(io.BytesIO(data), chunk_size=size)) == expected
+        assert ''.join(markdownify_stream(memoryview(data), chunk_size=size)) == expected
+    plain = page.replace('Heading', 'Заголовок')
+    assert ''.join(markdownify_stream(plain.encode('koi8-r'), encoding='koi8-r')) == markdownify_lxml(plain)
+    assert ''.join(markdownify_stream(codecs.BOM_UTF16_LE + plain.encode('utf-16-le'))) == markdownify_lxml(plain)
+    assert list(markdownify_stream(b'')) == []
+
+
+def test_file(tmp_path):
+    src = tmp_path / 'page.html'
+    src.write_bytes(page.encode())
+    markdownify_file(src, tmp_path / 'page.md')
+    assert (tmp_path / 'page.md').read_text(encoding='utf-8') == markdownify_lxml(page)
+    out = io.StringIO()
+    markdownify_file(str(src), out, chunk_size=16)
+    assert out.getvalue() == markdownify_lxml(page)
+
+    blocks = []
+    markdownify_file(src, blocks)
+    assert ''.join(blocks) == markdownify_lxml(page) and len(blocks) > 1
+
+    (tmp_path / 'empty.html').write_bytes(b'')
+    markdownify_file(tmp_path / 'empty.html', tmp_path / 'empty.md')
+    assert (tmp_path / 'empty.md').read_text() == ''
+
+
+def test_options(tmp_path):
+    options = dict(heading_style=ATX, bullets='-', strip=['b'])
+    expected = markdownify_lxml(page, **options)
+    assert expected != markdownify_lxml(page)
+    for size in (7, len(page)):
+        assert ''.join(markdownify_stream(chunks(page, size), **options)) == expected
+    assert ''.join(markdownify_stream('<p>a <b>b</b></p>', strip=['b'])) == 'a b\n'
+    (tmp_path / 'page.html').write_text(page, encoding='utf-8')
+    markdownify_file(tmp_path / 'page.html', tmp_path / 'page.md', **options)
+    assert (tmp_path / 'page.md').read_text(encoding='utf-8') == expected
+    with pytest.raises(ValueError):
+        list(markdownify_stream(page, select='//h1'))
+
+
+def test_stream_too_deep():
+    html = '<p>before</p>' + '<div>' * 2100 + 'x' + '</div>' * 2100 + '<p>after</p>'
+    with pytest.raises(NestingTooDeep):
+        list(markdownify_stream(chunks(html, 1000)))
@@ -191,4 +191,49 @@ def test_table():
     assert md(table_head_body_missing_head) == '\n\n| Firstname | Lastname | Age |\n| --- | --- | --- |\n| Jill | Smith | 50 |\n| Eve | Jackson | 94 |\n\n'
     assert md(table_missing_text) == '\n\n|  | Lastname | Age |\n| --- | --- | --- |\n| Jill |  | 50 |\n| Eve | Jackson | 94 |\n\n'
     assert md(table_missing_head) == '\n\n| Firstname | Lastname | Age |\n| --- | --- | --- |\n| Jill | Smith | 50 |\n| Eve | Jackson | 94 |\n\n'
-    assert md(table_body) == '\n\n| Firstname | Lastname | Age |\n| --- | --- | --- |\n| Jill | Smith | 50 |\n| Eve | Jackson | 94 |\n\n'
\ No newline at end of file
+    assert md(table_body) == '\n\n| Firstname | Lastname | Age |\n| --- | --- | --- |\n| Jill | Smith | 50 |\n| Eve | Jackson | 94 |\n\n'
+
+
+table_with_spans = """<table>
+    <tr>
+        <th colspan="2">Name</th>
+        <th>Age</th>
+    </tr>
+    <tr>
+        <td rowspan="2">Jill</td>
+        <td>Smith</td>
+        <td>50</td>
+    </tr>
+    <tr>
+        <td>Jackson</td>
+        <td>94</td>
+    </tr>
+</table>"""
+
+
+def test_table_spans():
+    assert md(table_with_spans) == '\n\n| Name |  | Age |\n| --- | --- | --- |\n| Jill | Smith | 50 |\n|  | Jackson | 94 |\n\n'
+    assert md('<table><tr><td colspan="x">a</td><td colspan="0">b</td></tr></table>') == '\n\n| a | b |\n| --- | --- |\n\n'
+
+
+def test_table_rowspans_end_with_row_group():
+    # a rowspan reaching past its <thead> stops there
+    html = '<table><thead><tr><th rowspan="3">A</th><th>B</th></tr></thead><tbody><tr><td>1</td><td>2</td></tr></tbody></table>'
+    assert md(html) == '\n\n| A | B |\n| --- | --- |\n| 1 | 2 |\n\n'
+    # rowspan="0" spans the rest of the row group, and no further
+    html = ('<table><thead><tr><th>A</th><th>B</th></tr></thead><tbody><tr><td rowspan="0">1</td><td>2</td></tr>'
+            '<tr><td>3</td></tr></tbody><tbody><tr><td>4</td><td>5</td></tr></tbody></table>')
+    assert md(html) == '\n\n| A | B |\n| --- | --- |\n| 1 | 2 |\n|  | 3 |\n| 4 | 5 |\n\n'
+
+
+def test_table_padding():
+    assert md(table, pad_tables=True) == '\n\n| Firstname | Lastname | Age |\n| --------- | -------- | --- |\n| Jill      | Smith    | 50  |\n| Eve       | Jackson  | 94  |\n\n'
+    assert md(table_missing_text, pad_tables=True) == '\n\n|      | Lastname | Age |\n| ---- | -------- | --- |\n| Jill |          | 50  |\n| Eve  | Jackson  | 94  |\n\n'
+    assert md(table_with_spans, pad_tables=True) == '\n\n| Name |         | Age |\n| ---- | ------- | --- |\n| Jill | Smith   | 50  |\n|      | Jackson | 94  |\n\n'
+    assert md('<table><tr><td>a</td></tr><tr><td>b</td><td>c</td></tr></table>', pad_tables=True) == '\n\n| a   |     |\n| --- | --- |\n| b   | c   |\n\n'
+
+
+def test_table_thead_after_body():
+    # only the table's own <thead> makes the first body row a plain row
+    nested = '<table><tbody><tr><td>a</td></tr></tbody><tr><td><table><thead><tr><th>x</th></tr></thead></table></td></tr></table>'
+    assert md(nested).startswith('\n\n| a |\n| --- |\n')
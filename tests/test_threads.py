@@ -0,0 +1,45 @@
+import threading
+
+from markdownify import ConversionStats, FragmentCache, MemoryCache, markdownify, markdownify_fast, markdownify_lxml
+
+from .test_tables import table, table_with_html_content
+
+pages = [
+    '<h1>Title %d</h1><p>Some <b>bold</b> and <i>italic_text</i></p><ol start="%d"><li>a</li><li>b</li></ol>' % (i, i)
+    + '<pre class="python"><code>x = %d</code></pre>%s' % (i, table if i % 2 else table_with_html_content)
+    + '<div>' * (i * 20) + 'deep %d' % i + '</div>' * (i * 20)
+    for i in range(24)
+]
+
+
+def hammer(convert, threads=8, rounds=12, **kwargs):
+    expected = [convert(page) for page in pages]
+    failures = []
+    start = threading.Barrier(threads)
+
+    def work(offset):
+        start.wait()
+        for n in range(rounds):
+            i = (offset + n) % len(pages)
+            result = convert(pages[i], **kwargs)
+            if result != expected[i]:
+                failures.append((i, result))
+
+    workers = [threading.Thread(target=work, args=(offset,)) for offset in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert failures == []
+
+
+def test_engines_from_many_threads():
+    for convert in (markdownify, markdownify_fast, markdownify_lxml):
+        hammer(convert)
+
+
+def test_shared_caches_from_many_threads():
+    hammer(markdownify_lxml, cache=MemoryCache(max_bytes=20000))
+    hammer(markdownify_lxml, fragments=FragmentCache(max_bytes=20000, min_bytes=50))
+    # a shared ConversionStats may lose counts, but never changes the output
+    hammer(markdownify_fast, stats=ConversionStats())